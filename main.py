@@ -1,16 +1,34 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context
 import requests
 import json
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import threading
+import multiprocessing
+import shutil
+import subprocess
 import schedule
 import os
-from dataclasses import dataclass
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+import math
+import sqlite3
+import hashlib
+import unicodedata
+import random
+import base64
+from collections import deque
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from string import Template
+from typing import List, Dict, Optional, Callable, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from bs4 import BeautifulSoup, SoupStrainer
+from xml.etree import ElementTree as ET
+from io import BytesIO
+import html
 import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urlencode, parse_qsl, quote_plus
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Carrega variáveis do arquivo .env
@@ -18,13 +36,968 @@ load_dotenv()
 
 app = Flask(__name__)
 
+def parse_published_at(value: str) -> Optional[datetime]:
+    """Converte datas RFC 822 (RSS) ou ISO 8601 para datetime em UTC; None se inválida"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+    # Datas sem fuso são consideradas no horário local do servidor
+    return parsed.astimezone(timezone.utc)
+
 @dataclass
 class Article:
     title: str
     url: str
     description: str
-    published_at: str
+    published_at: str  # ISO 8601 em UTC quando a fonte informa a data; vazio se desconhecida
     source: str
+    related_urls: List[str] = field(default_factory=list)  # Cópias da mesma notícia em outras fontes
+    keywords: List[str] = field(default_factory=list)  # Palavras-chave encontradas no artigo
+    published_utc: Optional[datetime] = field(default=None, compare=False)
+
+    def __post_init__(self):
+        if self.published_utc is None:
+            self.published_utc = parse_published_at(self.published_at)
+        if self.published_utc is not None:
+            self.published_at = self.published_utc.isoformat()
+
+@dataclass
+class CollectionResult:
+    """Resultado de uma coleta: artigos únicos e estatísticas por fonte"""
+    articles: List[Article]
+    stats: Dict[str, Dict] = field(default_factory=dict)
+    elapsed: float = 0.0
+    timed_out: bool = False
+    first_result_ms: Optional[float] = None  # Tempo até a primeira unidade com artigos
+
+# Coleta concorrente: número máximo de requisições simultâneas e prazo total (segundos)
+COLLECT_MAX_WORKERS = int(os.getenv('COLLECT_MAX_WORKERS', '12'))
+COLLECT_DEADLINE = float(os.getenv('COLLECT_DEADLINE', '25'))
+
+# Pool de conexões HTTP compartilhado (por host) e HTTP/2 opcional via httpx
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+class HttpClient:
+    """Cliente HTTP compartilhado com pool de conexões keep-alive por host"""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, http2: bool = HTTP2_ENABLED):
+        self.lock = threading.Lock()
+        self.host_stats: Dict[str, Dict] = {}
+        
+        # requests.Session mantém um pool urllib3 por host com keep-alive
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        
+        # HTTP/2 é negociado via ALPN quando o servidor suporta (requer httpx[http2])
+        self.h2_client = None
+        if http2:
+            try:
+                import httpx
+                self.h2_client = httpx.Client(
+                    http2=True,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                )
+            except ImportError:
+                print("⚠️ HTTP/2 indisponível (instale httpx[http2]), usando HTTP/1.1 com keep-alive")
+
+    def request(self, method: str, url: str, **kwargs):
+        """Executa a requisição reutilizando conexões do pool e registra estatísticas"""
+        host = urlparse(url).netloc
+        started = time.monotonic()
+        try:
+            if self.h2_client is not None and not kwargs.get('stream'):
+                response = self._h2_request(method, url, **kwargs)
+                http_version = response.http_version
+            else:
+                response = self.session.request(method, url, **kwargs)
+                http_version = 'HTTP/1.1'
+        except Exception:
+            self._record(host, time.monotonic() - started, None, error=True)
+            raise
+        
+        self._record(host, time.monotonic() - started, http_version)
+        return response
+
+    def _h2_request(self, method: str, url: str, **kwargs):
+        """Requisição via httpx com as exceções traduzidas para as do requests, para que
+        is_transient_error, as novas tentativas e os circuit breakers tratem os dois caminhos igual"""
+        import httpx
+        try:
+            return self.h2_client.request(method, url, **kwargs)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def download(self, url: str, max_bytes: int, timeout: float = 30,
+                 chunk_size: int = 64 * 1024) -> Tuple[bytes, Dict[str, str]]:
+        """Baixa o corpo em blocos com memória limitada; aborta acima de max_bytes.
+        Retorna (conteúdo, cabeçalhos)."""
+        response = self.get(url, stream=True, timeout=timeout)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"download retornou status {response.status_code}")
+            declared = int(response.headers.get('Content-Length') or 0)
+            if declared > max_bytes:
+                raise ValueError(f"arquivo de {declared} bytes excede o limite de {max_bytes}")
+            
+            buffer = bytearray()
+            for chunk in response.iter_content(chunk_size):
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    raise ValueError(f"download excedeu o limite de {max_bytes} bytes")
+            return bytes(buffer), dict(response.headers)
+        finally:
+            response.close()
+
+    def _record(self, host: str, elapsed: float, http_version: Optional[str], error: bool = False):
+        with self.lock:
+            stats = self.host_stats.setdefault(host, {
+                'requests': 0, 'errors': 0, 'total_ms': 0.0, 'versions': {}
+            })
+            stats['requests'] += 1
+            stats['total_ms'] = round(stats['total_ms'] + elapsed * 1000, 1)
+            if error:
+                stats['errors'] += 1
+            if http_version:
+                stats['versions'][http_version] = stats['versions'].get(http_version, 0) + 1
+
+    def pool_stats(self) -> Dict[str, Dict]:
+        """Estatísticas por host: requisições feitas e conexões realmente abertas"""
+        with self.lock:
+            stats = {host: dict(values, versions=dict(values['versions']))
+                     for host, values in self.host_stats.items()}
+        
+        # Contadores do urllib3: num_connections < num_requests indica reuso (keep-alive)
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            entry = stats.setdefault(host, {'requests': 0, 'errors': 0, 'total_ms': 0.0, 'versions': {}})
+            entry['connections_opened'] = pool.num_connections
+            entry['pool_requests'] = pool.num_requests
+        
+        for entry in stats.values():
+            if entry['requests']:
+                entry['avg_ms'] = round(entry['total_ms'] / entry['requests'], 1)
+        
+        return stats
+
+http_client = HttpClient()
+
+# Diretório para dados persistentes (caches, índices, filas)
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+
+class FeedCache:
+    """Cache de feeds com GET condicional (ETag/Last-Modified) e itens já processados"""
+
+    def __init__(self, path: str = os.path.join(DATA_DIR, 'feed_cache.json')):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Cache de feeds ignorado ({e})")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def fetch(self, url: str, parse: Callable[[bytes], List[Dict]], headers: Optional[Dict[str, str]] = None,
+              timeout: float = 10) -> Optional[List[Dict]]:
+        """Retorna os itens do feed; em 304 não baixa nem processa o documento novamente.
+        Retorna None quando o servidor responde com erro."""
+        with self.lock:
+            entry = self.entries.get(url)
+        
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+        
+        response = http_client.get(url, headers=request_headers, timeout=timeout)
+        
+        if response.status_code == 304 and entry:
+            with self.lock:
+                self.hits += 1
+                entry['checked_at'] = time.time()
+            return entry['items']
+        
+        if response.status_code != 200:
+            return None
+        
+        items = parse(response.content)
+        
+        with self.lock:
+            self.misses += 1
+            # Só vale a pena guardar se o servidor fornece validadores
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self.entries[url] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'items': items,
+                    'checked_at': time.time()
+                }
+                try:
+                    self._save()
+                except Exception as e:
+                    print(f"⚠️ Erro ao salvar cache de feeds: {e}")
+        
+        return items
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+
+feed_cache = FeedCache()
+
+class BloomFilter:
+    """Filtro de Bloom de tamanho fixo: pode dar falso positivo, nunca falso negativo"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.size = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Duplo hashing (Kirsch-Mitzenmacher) a partir de um único SHA-256
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+def normalize_url(url: str) -> str:
+    """Normaliza URL para comparação: remove fragmento, parâmetros de rastreamento e barra final"""
+    parsed = urlparse(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in ('fbclid', 'gclid', 'oc')]
+    path = parsed.path.rstrip('/') or '/'
+    return parsed._replace(
+        scheme=parsed.scheme.lower(),
+        netloc=parsed.netloc.lower(),
+        path=path,
+        query=urlencode(sorted(query)),
+        fragment=''
+    ).geturl()
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação, para comparação de textos"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+# Palavras muito comuns que não ajudam a identificar uma notícia
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'no', 'na', 'nos', 'nas',
+    'um', 'uma', 'para', 'por', 'com', 'que', 'se', 'ao', 'aos', 'sobre', 'apos', 'mais'
+}
+
+SIMHASH_BITS = 64
+SIMHASH_MAX_DISTANCE = int(os.getenv('SIMHASH_MAX_DISTANCE', '6'))
+
+@lru_cache(maxsize=None)
+def simhash_blocks(max_distance: int) -> Tuple[Tuple[int, int], ...]:
+    """Divide os 64 bits em max_distance + 2 blocos (deslocamento, largura)"""
+    count = max_distance + 2
+    widths = [SIMHASH_BITS // count + (1 if i < SIMHASH_BITS % count else 0) for i in range(count)]
+    shifts = [sum(widths[:i]) for i in range(count)]
+    return tuple(zip(shifts, widths))
+
+def simhash_band_keys(fingerprint: int, max_distance: int = SIMHASH_MAX_DISTANCE) -> List[Tuple[int, int]]:
+    """Chaves LSH (faixa, valor) do SimHash: uma para cada par de blocos.
+    
+    Dois SimHashes a distância <= max_distance diferem em no máximo max_distance blocos e
+    portanto coincidem em pelo menos dois: sempre colidem em alguma chave. Com o padrão (6)
+    são 28 chaves de 16 bits, ou seja, ~N/2300 candidatos aleatórios por consulta.
+    """
+    blocks = simhash_blocks(max_distance)
+    values = [(fingerprint >> shift) & ((1 << width) - 1) for shift, width in blocks]
+    keys = []
+    for i in range(len(blocks)):
+        for j in range(i + 1, len(blocks)):
+            keys.append((len(keys), values[i] << blocks[j][1] | values[j]))
+    return keys
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count('1')
+
+def story_simhash(title: str, description: str = '') -> int:
+    """SimHash de 64 bits do título (peso maior) e da descrição normalizados"""
+    # Remove o sufixo " - Veículo" que os agregadores adicionam ao título
+    title = re.split(r'\s+[-|–]\s+(?=[^-|–]{1,40}$)', title)[0]
+    weights: Dict[str, int] = {}
+    for text, weight in ((title, 3), (description, 1)):
+        tokens = [token for token in normalize_text(text).split() if token not in STOPWORDS]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            weights[feature] = weights.get(feature, 0) + weight
+    
+    vector = [0] * SIMHASH_BITS
+    for feature, weight in weights.items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            vector[bit] += weight if value >> bit & 1 else -weight
+    
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if vector[bit] > 0)
+
+class NearDuplicateIndex:
+    """Índice LSH de SimHashes em memória (uma coleta): consulta só os candidatos que
+    compartilham alguma chave e confirma pela distância de Hamming exata"""
+
+    def __init__(self, max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.tables: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+        self.size = 0
+
+    def add(self, fingerprint: int, key: str):
+        for band_key in simhash_band_keys(fingerprint, self.max_distance):
+            self.tables.setdefault(band_key, []).append((fingerprint, key))
+        self.size += 1
+
+    def query(self, fingerprint: int) -> Optional[Tuple[str, int]]:
+        """Retorna a chave mais próxima dentro da distância máxima, ou None"""
+        best = None
+        for band_key in simhash_band_keys(fingerprint, self.max_distance):
+            for candidate, key in self.tables.get(band_key, ()):
+                distance = hamming_distance(candidate, fingerprint)
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (key, distance)
+        return best
+
+# Preferência de fonte ao escolher o representante de um grupo de notícias iguais
+SOURCE_PRIORITY = ['NewsAPI', 'Google News', 'Bing News']
+
+def source_rank(source: str) -> int:
+    """Sites locais (fonte primária) primeiro, depois NewsAPI, Google News e Bing News"""
+    for rank, prefix in enumerate(SOURCE_PRIORITY, start=1):
+        if source.startswith(prefix):
+            return rank
+    return 0
+
+def collapse_near_duplicates(articles: List[Article]) -> List[Article]:
+    """Agrupa cópias da mesma notícia e mantém um representante por grupo"""
+    index = NearDuplicateIndex()
+    clusters: Dict[str, List[Article]] = {}
+    
+    for article in articles:
+        fingerprint = story_simhash(article.title, article.description)
+        match = index.query(fingerprint)
+        cluster_key = match[0] if match else article.url
+        clusters.setdefault(cluster_key, []).append(article)
+        index.add(fingerprint, cluster_key)
+    
+    representatives = []
+    for members in clusters.values():
+        best = min(members, key=lambda a: (source_rank(a.source), -len(a.description)))
+        best.related_urls = [a.url for a in members if a is not best] + [
+            url for a in members if a is not best for url in a.related_urls
+        ]
+        representatives.append(best)
+    
+    return representatives
+
+def signed64(value: int) -> int:
+    """Converte inteiro sem sinal de 64 bits para o formato aceito pelo SQLite"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class SeenArticleStore:
+    """Registro persistente (SQLite) de artigos já processados/publicados, com Bloom filter na frente
+    e índice de SimHash para reconhecer a mesma notícia publicada em outra URL"""
+
+    def __init__(self, path: str = os.path.join(DATA_DIR, 'articles.db'), bloom_capacity: int = 100000):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                title TEXT,
+                source TEXT,
+                status TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(articles)")]
+        if 'simhash' not in columns:
+            self.conn.execute("ALTER TABLE articles ADD COLUMN simhash INTEGER")
+        # Data do item mais recente já visto em cada fonte (coleta incremental)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS source_watermarks (
+                source TEXT PRIMARY KEY,
+                watermark REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Chaves LSH dos SimHashes, consultadas pelo índice em vez de carregadas em memória
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS simhash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                url_key TEXT NOT NULL,
+                PRIMARY KEY (band, value, url_key)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+        self._rebuild_bands_if_needed()
+        
+        # O filtro evita ir ao disco para a grande maioria dos artigos novos
+        self.bloom = BloomFilter(capacity=bloom_capacity)
+        for (url_key,) in self.conn.execute("SELECT url_key FROM articles"):
+            self.bloom.add(url_key)
+        self.bloom_skips = 0
+        self.db_checks = 0
+        self.near_duplicates = 0
+
+    def _rebuild_bands_if_needed(self):
+        """Recria as chaves LSH quando a distância máxima muda (ou no primeiro uso da tabela)"""
+        scheme = str(SIMHASH_MAX_DISTANCE)
+        row = self.conn.execute("SELECT value FROM store_meta WHERE key = 'simhash_scheme'").fetchone()
+        if row and row[0] == scheme:
+            return
+        print(f"🔁 Reindexando SimHashes (distância máxima {scheme})...")
+        self.conn.execute("DELETE FROM simhash_bands")
+        rows = self.conn.execute("SELECT url_key, simhash FROM articles WHERE simhash IS NOT NULL ORDER BY first_seen")
+        for url_key, fingerprint in rows.fetchall():
+            fingerprint &= (1 << SIMHASH_BITS) - 1
+            if self._near_duplicate(fingerprint):
+                continue
+            self._add_bands(fingerprint, url_key)
+        self.conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('simhash_scheme', ?)", (scheme,))
+        self.conn.commit()
+
+    def _add_bands(self, fingerprint: int, url_key: str):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO simhash_bands (band, value, url_key) VALUES (?, ?, ?)",
+            [(band, value, url_key) for band, value in simhash_band_keys(fingerprint)]
+        )
+
+    def _near_duplicate(self, fingerprint: int) -> Optional[Tuple[str, int]]:
+        """Artigo registrado mais próximo dentro da distância máxima (chamar com o lock)"""
+        best = None
+        checked = set()
+        for band, value in simhash_band_keys(fingerprint):
+            rows = self.conn.execute("""
+                SELECT b.url_key, a.simhash FROM simhash_bands b
+                JOIN articles a ON a.url_key = b.url_key
+                WHERE b.band = ? AND b.value = ?
+            """, (band, value)).fetchall()
+            for url_key, candidate in rows:
+                if url_key in checked:
+                    continue
+                checked.add(url_key)
+                distance = hamming_distance(candidate, fingerprint)
+                if distance <= SIMHASH_MAX_DISTANCE and (best is None or distance < best[1]):
+                    best = (url_key, distance)
+        return best
+
+    def filter_new(self, articles: List[Article], count_stats: bool = True) -> List[Article]:
+        """Remove artigos que já foram processados ou publicados em execuções anteriores"""
+        candidates = {}
+        new_articles = []
+        for article in articles:
+            url_key = normalize_url(article.url)
+            if url_key in self.bloom:
+                candidates[url_key] = article
+            elif count_stats:
+                self.bloom_skips += 1
+        
+        known = set()
+        if candidates:
+            keys = list(candidates)
+            with self.lock:
+                if count_stats:
+                    self.db_checks += len(keys)
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = self.conn.execute(
+                        f"SELECT url_key FROM articles WHERE url_key IN ({placeholders})", chunk
+                    ).fetchall()
+                    known.update(row[0] for row in rows)
+        
+        for article in articles:
+            if normalize_url(article.url) in known:
+                continue
+            # Mesma notícia já tratada, vinda de outra fonte/URL
+            with self.lock:
+                match = self._near_duplicate(story_simhash(article.title, article.description))
+            if match:
+                if count_stats:
+                    self.near_duplicates += 1
+                continue
+            new_articles.append(article)
+        
+        return new_articles
+
+    def mark_article(self, article: Article, status: str):
+        """Registra o artigo e sua impressão digital (SimHash) com o status informado"""
+        self.mark(article.url, status, article.title, article.source,
+                  fingerprint=story_simhash(article.title, article.description))
+
+    def mark(self, url: str, status: str, title: str = '', source: str = '', fingerprint: Optional[int] = None):
+        """Registra a URL com o status informado ('processed' ou 'published'); 'published' nunca é rebaixado"""
+        url_key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO articles (url_key, url, title, source, status, first_seen, updated_at, simhash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url_key) DO UPDATE SET
+                    status = CASE WHEN articles.status = 'published' THEN articles.status ELSE excluded.status END,
+                    updated_at = excluded.updated_at,
+                    simhash = COALESCE(excluded.simhash, articles.simhash)
+            """, (url_key, url, title, source, status, now, now,
+                  signed64(fingerprint) if fingerprint is not None else None))
+            if fingerprint is not None and not self._near_duplicate(fingerprint):
+                self._add_bands(fingerprint, url_key)
+            self.conn.commit()
+            self.bloom.add(url_key)
+
+    def get_watermarks(self) -> Dict[str, datetime]:
+        """Data (UTC) do item mais recente visto em cada fonte nas execuções incrementais"""
+        with self.lock:
+            rows = self.conn.execute("SELECT source, watermark FROM source_watermarks").fetchall()
+        return {source: datetime.fromtimestamp(watermark, timezone.utc) for source, watermark in rows}
+
+    def advance_watermarks(self, newest: Dict[str, datetime]):
+        """Avança (nunca recua) a marca de cada fonte"""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany("""
+                INSERT INTO source_watermarks (source, watermark, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    watermark = MAX(source_watermarks.watermark, excluded.watermark),
+                    updated_at = excluded.updated_at
+            """, [(source, moment.timestamp(), now) for source, moment in newest.items()])
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM articles GROUP BY status").fetchall())
+            bands = self.conn.execute("SELECT COUNT(*) FROM simhash_bands").fetchone()[0]
+        return {
+            'by_status': counts,
+            'bloom_skips': self.bloom_skips,
+            'db_checks': self.db_checks,
+            'near_duplicates': self.near_duplicates,
+            'fingerprints': bands // len(simhash_band_keys(0))
+        }
+
+seen_store = SeenArticleStore()
+
+# Tamanho máximo do parâmetro q (codificado) aceito por cada provedor
+QUERY_MAX_LENGTH = {
+    'NewsAPI': 500,
+    'Google News': 250
+}
+NEWSAPI_PAGE_SIZE = 100
+RSS_MAX_ITEMS = int(os.getenv('RSS_MAX_ITEMS', '50'))
+
+def plan_queries(keywords: List[str], max_length: int) -> List[Tuple[str, List[str]]]:
+    """Agrupa palavras-chave no menor número de consultas OR que cabem no limite do provedor"""
+    batches = []
+    terms: List[str] = []
+    batch_keywords: List[str] = []
+    
+    for keyword in dict.fromkeys(k.strip() for k in keywords if k.strip()):
+        term = f'"{keyword}"' if ' ' in keyword else keyword
+        if terms and len(quote_plus(' OR '.join(terms + [term]))) > max_length:
+            batches.append((' OR '.join(terms), batch_keywords))
+            terms, batch_keywords = [], []
+        terms.append(term)
+        batch_keywords.append(keyword)
+    
+    if terms:
+        batches.append((' OR '.join(terms), batch_keywords))
+    return batches
+
+def compile_keyword_matcher(keywords: List[str]) -> Tuple[re.Pattern, Dict[str, str]]:
+    """Compila uma única regex com todas as palavras-chave (texto normalizado) e o mapa de volta
+    para a palavra-chave original"""
+    keyword_by_term = {normalize_text(keyword): keyword for keyword in keywords if normalize_text(keyword)}
+    # Termos mais longos primeiro para preferir "sao sebastiao" a um termo contido nele
+    terms = sorted(keyword_by_term, key=len, reverse=True)
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\b') if terms else re.compile(r'(?!)')
+    return pattern, keyword_by_term
+
+def match_keywords(text: str, keywords: List[str]) -> List[str]:
+    """Retorna as palavras-chave presentes no texto (sem diferenciar acentos e maiúsculas)"""
+    normalized = f" {normalize_text(text)} "
+    return [keyword for keyword in keywords if f" {normalize_text(keyword)} " in normalized]
+
+# Dicionários da classificação editorial (a ordem dos valores define a prioridade).
+# Termos terminados em "*" casam como radical (brasil* -> brasileira, brasileiros); os demais
+# casam a palavra inteira com plural simples, então plurais irregulares são listados à parte
+LITORAL_CITIES = ["Ilhabela", "São Sebastião", "Caraguatatuba", "Ubatuba"]
+ENTITY_DICTIONARIES = {
+    'city': {city: [city] for city in LITORAL_CITIES},
+    'region': {'Litoral Norte': ["Litoral Norte"] + LITORAL_CITIES},
+    'scope': {
+        'Brasil': ["brasil*", "federal", "federais", "nacional", "nacionais", "país", "países"],
+        'Mundo': ["internacional", "internacionais", "mundial", "mundiais", "exterior", "país", "países"]
+    },
+    'theme': {
+        "Turismo": ["turismo", "turista", "visitante", "hotel", "hotéis", "pousada"],
+        "Meio Ambiente": ["meio ambiente", "preservação", "natureza", "sustentabilidade"],
+        "Saúde": ["saúde", "hospital", "hospitais", "médico", "tratamento"],
+        "Educação": ["educação", "escola", "universidade", "ensino"],
+        "Segurança": ["segurança", "polícia", "bombeiros", "emergência"],
+        "Infraestrutura": ["obra", "construção", "estrada", "ponte"],
+        "Eventos": ["evento", "festival", "show", "apresentação"]
+    },
+    'agency': {
+        "Prefeitura Municipal": ["prefeitura"],
+        "Corpo de Bombeiros": ["bombeiros"],
+        "Polícia Civil": ["polícia"],
+        "Governo do Estado de São Paulo": ["governo"],
+        "Secretaria de Saúde": ["saúde"]
+    }
+}
+
+@dataclass
+class EntityMatches:
+    """Resultado de uma passada do EntityMatcher: (categoria, valor) -> [prioridade, onde apareceu]"""
+    hits: Dict[Tuple[str, str], list] = field(default_factory=dict)
+
+    def values(self, category: str, where: Optional[str] = None) -> List[str]:
+        """Valores encontrados na categoria, na ordem do dicionário; where='title' ou 'description'
+        restringe ao trecho do texto"""
+        found = [(order, value) for (hit_category, value), (order, places) in self.hits.items()
+                 if hit_category == category and (where is None or where in places)]
+        return [value for order, value in sorted(found)]
+
+class EntityMatcher:
+    """Casa cidades, região, abrangência, temas e órgãos em uma única regex sobre o texto
+    normalizado, em vez de um laço de buscas por substring para cada dicionário.
+
+    Formas flexionadas que a busca por substring original já reconhecia:
+
+    >>> entity_matcher.match('Economia brasileira cresce').values('scope')
+    ['Brasil']
+    >>> entity_matcher.match('Brasileiros viajam mais').values('scope')
+    ['Brasil']
+    >>> entity_matcher.match('Países vizinhos fecham acordo').values('scope')
+    ['Brasil', 'Mundo']
+    >>> entity_matcher.match('Verbas federais para hospitais').values('theme')
+    ['Saúde']
+    >>> entity_matcher.match('Eleições nacionais').values('scope')
+    ['Brasil']
+    >>> entity_matcher.match('Turistas lotam hotéis e obras param').values('theme')
+    ['Turismo', 'Infraestrutura']
+    >>> entity_matcher.match('Paisagem de Ilhabela').values('scope')
+    []
+    """
+
+    def __init__(self, dictionaries: Dict[str, Dict[str, List[str]]]):
+        self.entries_by_term: Dict[str, List[Tuple[str, str, int]]] = {}
+        stems = set()
+        for category, values in dictionaries.items():
+            for order, (value, terms) in enumerate(values.items()):
+                for term in terms:
+                    normalized = normalize_text(term)
+                    if normalized:
+                        if term.endswith('*'):
+                            stems.add(normalized)
+                        self.entries_by_term.setdefault(normalized, []).append((category, value, order))
+
+        # Termos mais longos primeiro; "s?" aceita o plural simples (turistas, obras) sem casar
+        # prefixos como "paisagem" para "pais"; radicais aceitam qualquer terminação
+        stem_terms = sorted(stems, key=len, reverse=True)
+        word_terms = sorted(set(self.entries_by_term) - stems, key=len, reverse=True)
+        alternatives = []
+        if stem_terms:
+            alternatives.append(r'(' + '|'.join(re.escape(term) for term in stem_terms) + r')\w*')
+        alternatives.append(r'(' + '|'.join(re.escape(term) for term in word_terms) + r')s?')
+        self.pattern = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b')
+
+    def match(self, title: str, description: str = '') -> EntityMatches:
+        """Uma passada sobre título + descrição, registrando se cada ocorrência está no título"""
+        normalized_title = normalize_text(title or '')
+        text = f"{normalized_title} | {normalize_text(description or '')}"
+
+        matches = EntityMatches()
+        for found in self.pattern.finditer(text):
+            where = 'title' if found.start() < len(normalized_title) else 'description'
+            term = next(group for group in found.groups() if group)
+            for category, value, order in self.entries_by_term[term]:
+                matches.hits.setdefault((category, value), [order, set()])[1].add(where)
+        return matches
+
+entity_matcher = EntityMatcher(ENTITY_DICTIONARIES)
+
+# Parser HTML: lxml (bem mais rápido) quando instalado, senão o parser puro-Python
+try:
+    from lxml import etree as lxml_etree
+    DEFAULT_HTML_PARSER = 'lxml'
+except ImportError:
+    lxml_etree = None
+    DEFAULT_HTML_PARSER = 'html.parser'
+
+# Estratégia de parsing por fonte (sobrescreva com PARSER_OVERRIDES="bing=html.parser,rss=etree")
+PARSER_BY_SOURCE = {
+    'bing': DEFAULT_HTML_PARSER,          # parser do BeautifulSoup
+    'local': DEFAULT_HTML_PARSER,
+    'google_html': DEFAULT_HTML_PARSER,
+    'rss': 'iterparse',                   # 'iterparse' (para após N itens) ou 'etree' (documento inteiro)
+    'rss_description': 'strip'            # 'strip' (regex) ou 'soup' (BeautifulSoup)
+}
+for override in filter(None, os.getenv('PARSER_OVERRIDES', '').split(',')):
+    source_key, _, parser_name = override.partition('=')
+    if source_key.strip() in PARSER_BY_SOURCE and parser_name.strip():
+        PARSER_BY_SOURCE[source_key.strip()] = parser_name.strip()
+
+# Parsing parcial: só constrói os nós que os seletores de cada fonte usam
+BING_STRAINER = SoupStrainer(class_=['news-card', 'newsitem', 'b_algo'])
+LINK_STRAINER = SoupStrainer('a', href=True)
+LOCAL_STRAINER = SoupStrainer(['article', 'h2', 'h3', 'a'])
+
+# Sites locais: 'pages' lê capa/seções uma vez por execução; 'search' faz uma busca por palavra-chave
+LOCAL_SITES_MODE = os.getenv('LOCAL_SITES_MODE', 'pages')
+# Seletores candidatos para links de notícias, do mais específico ao mais genérico
+LOCAL_LINK_SELECTORS = ['article h2 a', 'article h3 a', 'h2 a', 'h3 a', 'article a', 'a']
+
+TAG_RE = re.compile(r'<[^>]+>')
+WHITESPACE_RE = re.compile(r'\s+')
+
+def make_soup(markup, source: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Cria o BeautifulSoup com o parser configurado para a fonte"""
+    return BeautifulSoup(markup, PARSER_BY_SOURCE.get(source, DEFAULT_HTML_PARSER), parse_only=parse_only)
+
+def strip_html(markup: str) -> str:
+    """Converte um trecho HTML simples (descrições de RSS) em texto sem montar árvore"""
+    if PARSER_BY_SOURCE['rss_description'] == 'soup':
+        return BeautifulSoup(markup, 'html.parser').get_text().strip()
+    return WHITESPACE_RE.sub(' ', html.unescape(TAG_RE.sub(' ', markup))).strip()
+
+def iter_rss_items(content: bytes, limit: int):
+    """Percorre os <item> de um RSS de forma incremental e para após `limit` itens"""
+    if PARSER_BY_SOURCE['rss'] == 'etree':
+        yield from ET.fromstring(content).findall('.//item')[:limit]
+        return
+    
+    if lxml_etree is not None:
+        events = lxml_etree.iterparse(BytesIO(content), events=('end',), tag='item', recover=True)
+    else:
+        events = (event for event in ET.iterparse(BytesIO(content), events=('end',)) if event[1].tag == 'item')
+    
+    count = 0
+    for _, item in events:
+        yield item
+        item.clear()  # Libera a memória do item já processado
+        count += 1
+        if count >= limit:
+            break
+
+def benchmark_parsers(iterations: int = 20) -> Dict[str, Dict[str, float]]:
+    """Compara o caminho antigo (html.parser/ElementTree completo) com o atual em documentos sintéticos"""
+    description = '&lt;a href="https://exemplo.com"&gt;Ilhabela recebe festival&lt;/a&gt;&amp;nbsp;&lt;font&gt;G1&lt;/font&gt;'
+    rss = ('<rss><channel>' + ''.join(
+        f'<item><title>Notícia {i} de Ilhabela</title><link>https://exemplo.com/{i}</link>'
+        f'<description>{description}</description><pubDate>Mon, 01 Jan 2024 10:00:00 GMT</pubDate></item>'
+        for i in range(100)) + '</channel></rss>').encode('utf-8')
+    filler = ''.join(f'<div class="nav"><span>menu {i}</span><ul><li>a</li><li>b</li></ul></div>' for i in range(300))
+    page = ('<html><body>' + filler + ''.join(
+        f'<div class="news-card"><h2><a href="https://exemplo.com/{i}">Notícia número {i} sobre Ubatuba</a></h2>'
+        f'<p>Resumo da notícia {i} com detalhes suficientes para o snippet.</p></div>'
+        for i in range(30)) + filler + '</body></html>').encode('utf-8')
+    
+    def legacy_rss():
+        root = ET.fromstring(rss)
+        for item in root.findall('.//item')[:RSS_MAX_ITEMS]:
+            BeautifulSoup(item.find('description').text, 'html.parser').get_text()
+    
+    def current_rss():
+        NewsCollector.parse_rss_items(rss, limit=RSS_MAX_ITEMS)
+    
+    cases = {
+        'rss': (legacy_rss, current_rss),
+        'bing': (lambda: BeautifulSoup(page, 'html.parser').select('.news-card'),
+                 lambda: make_soup(page, 'bing', parse_only=BING_STRAINER).select('.news-card')),
+        'local': (lambda: BeautifulSoup(page, 'html.parser').find_all('a', href=True),
+                  lambda: make_soup(page, 'local', parse_only=LINK_STRAINER).find_all('a', href=True))
+    }
+    
+    results = {}
+    for name, (legacy, current) in cases.items():
+        timings = {}
+        for label, function in (('legacy_ms', legacy), ('current_ms', current)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                function()
+            timings[label] = round((time.perf_counter() - started) * 1000 / iterations, 2)
+        timings['speedup'] = round(timings['legacy_ms'] / max(timings['current_ms'], 0.001), 1)
+        results[name] = timings
+    
+    return results
+
+# Saúde das fontes: circuit breaker e timeouts adaptativos por host
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '300'))
+FETCH_MIN_TIMEOUT = 2.0
+FETCH_MAX_TIMEOUT = 10.0
+COLLECT_RETRIES = int(os.getenv('COLLECT_RETRIES', '2'))
+RETRY_BACKOFF = 0.5
+
+class SourceHealthTracker:
+    """Circuit breaker por host (fechado -> aberto após N falhas -> meio-aberto para um teste)
+    e timeout adaptado à latência observada"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_after: float = BREAKER_RESET_SECONDS,
+                 min_timeout: float = FETCH_MIN_TIMEOUT, max_timeout: float = FETCH_MAX_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.lock = threading.Lock()
+        self.hosts: Dict[str, Dict] = {}
+
+    def _entry(self, host: str) -> Dict:
+        return self.hosts.setdefault(host, {
+            'state': 'closed',
+            'consecutive_failures': 0,
+            'opened_at': 0.0,
+            'probe_in_flight': False,
+            'latencies': deque(maxlen=50),
+            'successes': 0,
+            'failures': 0,
+            'rejected': 0,
+            'sources': set(),
+            'last_error': ''
+        })
+
+    def allow(self, host: str, source: str = '') -> bool:
+        """Indica se uma requisição ao host pode ser feita agora"""
+        with self.lock:
+            entry = self._entry(host)
+            if source:
+                entry['sources'].add(source)
+            if entry['state'] == 'closed':
+                return True
+            if entry['state'] == 'open' and time.time() - entry['opened_at'] >= self.reset_after:
+                entry['state'] = 'half_open'
+            if entry['state'] == 'half_open' and not entry['probe_in_flight']:
+                entry['probe_in_flight'] = True  # Uma única requisição de teste
+                return True
+            entry['rejected'] += 1
+            return False
+
+    def release(self, host: str):
+        """Devolve a vaga de teste do meio-aberto quando a requisição não chegou a ser feita"""
+        with self.lock:
+            self._entry(host)['probe_in_flight'] = False
+
+    def record_success(self, host: str, latency: float):
+        with self.lock:
+            entry = self._entry(host)
+            entry['latencies'].append(latency)
+            entry['successes'] += 1
+            entry['consecutive_failures'] = 0
+            entry['state'] = 'closed'
+            entry['probe_in_flight'] = False
+
+    def record_failure(self, host: str, error: str):
+        with self.lock:
+            entry = self._entry(host)
+            entry['failures'] += 1
+            entry['consecutive_failures'] += 1
+            entry['last_error'] = error[:200]
+            if entry['state'] == 'half_open' or entry['consecutive_failures'] >= self.failure_threshold:
+                if entry['state'] != 'open':
+                    print(f"🔌 Circuito aberto para {host} ({entry['consecutive_failures']} falhas seguidas)")
+                entry['state'] = 'open'
+                entry['opened_at'] = time.time()
+            entry['probe_in_flight'] = False
+
+    @staticmethod
+    def _percentile(values: List[float], percentile: float) -> float:
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout_for(self, host: str) -> float:
+        """Timeout de ~3x o p95 da latência recente, limitado entre o mínimo e o máximo"""
+        with self.lock:
+            latencies = list(self._entry(host)['latencies'])
+        if len(latencies) < 5:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, self._percentile(latencies, 0.95) * 3))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.lock:
+            hosts = {host: dict(entry) for host, entry in self.hosts.items()}
+        
+        result = {}
+        for host, entry in hosts.items():
+            latencies = list(entry['latencies'])
+            result[host] = {
+                'state': entry['state'],
+                'sources': sorted(entry['sources']),
+                'consecutive_failures': entry['consecutive_failures'],
+                'successes': entry['successes'],
+                'failures': entry['failures'],
+                'rejected': entry['rejected'],
+                'last_error': entry['last_error'],
+                'p50_ms': round(self._percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+                'p95_ms': round(self._percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+                'timeout_s': round(self.timeout_for(host), 2),
+                'retry_in_s': round(max(0.0, self.reset_after - (time.time() - entry['opened_at'])), 1)
+                              if entry['state'] == 'open' else 0
+            }
+        return result
+
+source_health = SourceHealthTracker()
+
+def is_transient_error(error: Exception) -> bool:
+    """Falhas de rede/timeout e respostas 429/5xx de sobrecarga valem nova tentativa;
+    erros de conteúdo ou da API não"""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in (429, 502, 503, 504)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
 
 class NewsCollector:
     def __init__(self):
@@ -36,24 +1009,168 @@ class NewsCollector:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
 
+        # Sites locais relevantes
+        self.local_sites = [
+            {
+                'name': 'Portal Ilhabela',
+                'url': 'https://www.portalilhabela.com.br',
+                'search_path': '/busca?q=',
+                'pages': ['/']  # Capa e seções lidas uma vez por execução
+            },
+            {
+                'name': 'São Sebastião Online', 
+                'url': 'https://www.saosebastiaoonline.com.br',
+                'search_path': '/search?q=',
+                'pages': ['/']
+            },
+            {
+                'name': 'Caraguá News',
+                'url': 'https://www.caraguanews.com.br', 
+                'search_path': '/busca?termo=',
+                'pages': ['/']
+            }
+        ]
+
+        # Seletor de links que funcionou em cada site (aprendido e reutilizado entre execuções)
+        self.selectors_path = os.path.join(DATA_DIR, 'site_selectors.json')
+        self.selectors_lock = threading.Lock()
+        try:
+            with open(self.selectors_path, 'r', encoding='utf-8') as f:
+                self.site_selectors: Dict[str, str] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.site_selectors = {}
+
     def search_news(self, keywords: List[str], hours: int = 24) -> List[Article]:
         """Busca notícias das últimas X horas com palavras-chave específicas em múltiplas fontes"""
-        articles = []
-        
-        print(f"🔍 Buscando notícias com palavras-chave: {keywords}")
+        return self.collect(keywords, hours).articles
+
+    def build_units(self, keywords: List[str], hours: int) -> List[Tuple[str, str, str, Callable[[float], List[Article]]]]:
+        """Monta as unidades de coleta (fonte, consulta, host, função(timeout)) executadas em paralelo"""
+        units = []
         
-        # 1. NewsAPI (se disponível)
+        # 1. NewsAPI (se disponível) - palavras-chave agrupadas em consultas OR
         if self.news_api_key and self.news_api_key != 'YOUR_NEWS_API_KEY':
-            articles.extend(self.search_newsapi(keywords, hours))
+            for query, batch in plan_queries(keywords, QUERY_MAX_LENGTH['NewsAPI']):
+                units.append(('NewsAPI', query, 'newsapi.org',
+                              lambda timeout, b=batch: self.fetch_newsapi(b, hours, timeout=timeout)))
         
-        # 2. Google News
-        articles.extend(self.search_google_news(keywords, hours))
+        # 2. Google News - palavras-chave agrupadas em consultas OR
+        for query, batch in plan_queries(keywords, QUERY_MAX_LENGTH['Google News']):
+            units.append(('Google News', query, 'news.google.com',
+                          lambda timeout, b=batch: self.fetch_google_news(b, hours, timeout=timeout)))
         
         # 3. Bing News
-        articles.extend(self.search_bing_news(keywords, hours))
+        for keyword in keywords:
+            units.append(('Bing News', keyword, 'www.bing.com',
+                          lambda timeout, kw=keyword: self.fetch_bing_news(kw, hours, timeout=timeout)))
         
         # 4. Sites locais específicos do Litoral Norte
-        articles.extend(self.search_local_sites(keywords, hours))
+        for site in self.local_sites:
+            host = urlparse(site['url']).netloc
+            if LOCAL_SITES_MODE == 'search':
+                for keyword in keywords:
+                    units.append((site['name'], keyword, host,
+                                  lambda timeout, kw=keyword, s=site: self.fetch_local_site(s, kw, keywords, timeout=timeout)))
+            else:
+                # Cada página é baixada uma única vez e comparada com todas as palavras-chave
+                for page in site['pages']:
+                    units.append((site['name'], page, host,
+                                  lambda timeout, p=page, s=site: self.fetch_local_page(s, p, keywords, timeout=timeout)))
+        
+        return units
+
+    def collect(self, keywords: List[str], hours: int = 24, deadline: Optional[float] = None,
+                only_new: bool = False, incremental: bool = False) -> CollectionResult:
+        """Executa todas as unidades (fonte, palavra-chave) em paralelo respeitando um prazo total.
+        Com only_new, descarta artigos já processados ou publicados anteriormente.
+        Com incremental, cada fonte só retorna itens mais novos que o último visto na execução anterior."""
+        result = None
+        for event, payload in self.iter_collect(keywords, hours, deadline, only_new, incremental):
+            if event == 'result':
+                result = payload
+        return result
+
+    def iter_collect(self, keywords: List[str], hours: int = 24, deadline: Optional[float] = None,
+                     only_new: bool = False, incremental: bool = False):
+        """Versão em streaming de collect: gera ('unit', dados) assim que cada unidade termina
+        e, no final, ('result', CollectionResult) com o resultado consolidado"""
+        deadline = COLLECT_DEADLINE if deadline is None else deadline
+        started = time.monotonic()
+        collected_at = datetime.now(timezone.utc)
+        window_start = collected_at - timedelta(hours=hours)
+        watermarks = seen_store.get_watermarks() if incremental else {}
+        dated: Dict[str, List[Article]] = {}  # Itens com data que passaram pelo filtro, por fonte
+        
+        print(f"🔍 Buscando notícias com palavras-chave: {keywords}")
+        
+        units = self.build_units(keywords, hours)
+        stats: Dict[str, Dict] = {}
+        results: Dict[int, List[Article]] = {}
+        
+        deadline_at = started + deadline
+        executor = ThreadPoolExecutor(max_workers=COLLECT_MAX_WORKERS, thread_name_prefix='collector')
+        futures = {}
+        for index, (source, keyword, host, fetch) in enumerate(units):
+            futures[executor.submit(self._run_unit, fetch, source, host, deadline_at)] = (index, source, keyword)
+            source_stats = stats.setdefault(source, {
+                'units': 0, 'ok': 0, 'failed': 0, 'timed_out': 0, 'skipped': 0, 'retries': 0,
+                'articles': 0, 'outside_window': 0, 'already_seen': 0,
+                'slowest_ms': 0.0, 'total_ms': 0.0, 'errors': []
+            })
+            source_stats['units'] += 1
+        
+        not_done = set(futures)
+        first_result_ms = None
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                not_done.discard(future)
+                index, source, keyword = futures[future]
+                unit_articles, elapsed, error, attempts = future.result()
+                source_stats = stats[source]
+                elapsed_ms = round(elapsed * 1000, 1)
+                source_stats['slowest_ms'] = max(source_stats['slowest_ms'], elapsed_ms)
+                source_stats['total_ms'] = round(source_stats['total_ms'] + elapsed_ms, 1)
+                source_stats['retries'] += max(0, attempts - 1)
+                
+                if attempts == 0:
+                    # Circuito aberto ou sem tempo restante: nem chegou a fazer a requisição
+                    source_stats['skipped'] += 1
+                    source_stats['errors'].append(f"{keyword}: {error}")
+                elif error:
+                    source_stats['failed'] += 1
+                    source_stats['errors'].append(f"{keyword}: {error}")
+                    print(f"Erro ao buscar em {source} para '{keyword}': {error}")
+                else:
+                    source_stats['ok'] += 1
+                    results[index] = self._filter_by_time(unit_articles, source, window_start,
+                                                          watermarks.get(source), dated, source_stats)
+                    source_stats['articles'] += len(results[index])
+                    if results[index] and first_result_ms is None:
+                        first_result_ms = round((time.monotonic() - started) * 1000, 1)
+                    yield 'unit', {
+                        'source': source,
+                        'query': keyword,
+                        'elapsed_ms': elapsed_ms,
+                        'articles': results[index]
+                    }
+        except FuturesTimeout:
+            pass
+        finally:
+            # Não espera unidades atrasadas: o que não terminou no prazo é descartado
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        for future in not_done:
+            index, source, keyword = futures[future]
+            stats[source]['timed_out'] += 1
+            stats[source]['errors'].append(f"{keyword}: prazo de {deadline:.0f}s excedido")
+        
+        if not_done:
+            print(f"⏱️ {len(not_done)} de {len(units)} buscas não terminaram em {deadline:.0f}s")
+        
+        # Mantém a ordem das fontes para um resultado estável
+        articles = []
+        for index in sorted(results):
+            articles.extend(results[index])
         
         # Remove duplicatas baseado na URL
         seen_urls = set()
@@ -63,14 +1180,108 @@ class NewsCollector:
                 seen_urls.add(article.url)
                 unique_articles.append(article)
         
-        # Se não encontrou artigos suficientes, adiciona exemplos para teste
-        if len(unique_articles) < 5:
-            print("⚠️ Poucos artigos encontrados, adicionando exemplos para teste...")
-            test_articles = self.get_test_articles(keywords)
-            unique_articles.extend(test_articles)
+        # Agrupa a mesma notícia vinda de fontes diferentes (títulos quase iguais)
+        total = len(unique_articles)
+        unique_articles = collapse_near_duplicates(unique_articles)
+        if len(unique_articles) < total:
+            print(f"🧬 {total - len(unique_articles)} cópias da mesma notícia agrupadas")
+        
+        if only_new:
+            total = len(unique_articles)
+            unique_articles = seen_store.filter_new(unique_articles)
+            print(f"🆕 {len(unique_articles)} de {total} artigos ainda não processados")
+        
+        # Mais recentes primeiro; itens sem data (capas/scraping) contam como vistos agora
+        unique_articles.sort(key=lambda a: a.published_utc or collected_at, reverse=True)
+        
+        # Sem nenhuma notícia real, mostra exemplos para teste (nunca no modo automático/incremental)
+        if not unique_articles and not (only_new or incremental):
+            print("⚠️ Nenhum artigo encontrado, adicionando exemplos para teste...")
+            unique_articles = self.get_test_articles(keywords)
+        
+        if incremental and dated:
+            seen_store.advance_watermarks(self._safe_watermarks(dated))
+        
+        elapsed = time.monotonic() - started
+        print(f"✅ Total de {len(unique_articles)} artigos únicos encontrados em {elapsed:.1f}s")
+        yield 'result', CollectionResult(
+            articles=unique_articles[:20],  # Limita a 20 artigos mais recentes
+            stats=stats,
+            elapsed=round(elapsed, 3),
+            timed_out=bool(not_done),
+            first_result_ms=first_result_ms
+        )
+
+    @staticmethod
+    def _filter_by_time(articles: List[Article], source: str, window_start: datetime,
+                        watermark: Optional[datetime], dated: Dict[str, List[Article]], stats: Dict) -> List[Article]:
+        """Descarta itens fora da janela pedida ou não mais novos que a marca da fonte,
+        e guarda os itens com data mantidos para calcular a nova marca"""
+        kept = []
+        for article in articles:
+            published = article.published_utc
+            if published is None:
+                kept.append(article)  # Sem data: não há como filtrar
+                continue
+            if published < window_start:
+                stats['outside_window'] += 1
+                continue
+            if watermark is not None and published <= watermark:
+                stats['already_seen'] += 1
+                continue
+            dated.setdefault(source, []).append(article)
+            kept.append(article)
+        return kept
+
+    @staticmethod
+    def _safe_watermarks(dated: Dict[str, List[Article]]) -> Dict[str, datetime]:
+        """Nova marca de cada fonte: a data mais recente até a qual todos os itens dessa fonte
+        já foram processados. Itens cortados pelo limite de 20 ou ainda não escolhidos pelo
+        modo automático seguram a marca e voltam nas próximas execuções."""
+        marks = {}
+        for source, articles in dated.items():
+            pending = seen_store.filter_new(articles, count_stats=False)
+            oldest_pending = min((article.published_utc for article in pending), default=None)
+            done = [article.published_utc for article in articles
+                    if oldest_pending is None or article.published_utc < oldest_pending]
+            if done:
+                marks[source] = max(done)
+        return marks
+
+    @staticmethod
+    def _run_unit(fetch: Callable[[float], List[Article]], source: str, host: str,
+                  deadline_at: float) -> Tuple[List[Article], float, Optional[str], int]:
+        """Executa uma unidade com circuit breaker, timeout adaptativo e novas tentativas com backoff
+        dentro do prazo total. Retorna (artigos, tempo, erro, tentativas)."""
+        started = time.monotonic()
+        attempts = 0
         
-        print(f"✅ Total de {len(unique_articles)} artigos únicos encontrados")
-        return unique_articles[:20]  # Limita a 20 artigos mais recentes
+        while True:
+            if not source_health.allow(host, source):
+                return [], time.monotonic() - started, f"circuito aberto para {host}", attempts
+            
+            remaining = deadline_at - time.monotonic()
+            timeout = min(source_health.timeout_for(host), remaining)
+            if timeout < FETCH_MIN_TIMEOUT / 2:
+                # Libera o teste do meio-aberto sem contar como falha do host
+                source_health.release(host)
+                return [], time.monotonic() - started, "sem tempo restante no prazo da coleta", attempts
+            
+            attempts += 1
+            attempt_started = time.monotonic()
+            try:
+                articles = fetch(timeout)
+                source_health.record_success(host, time.monotonic() - attempt_started)
+                return articles, time.monotonic() - started, None, attempts
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                source_health.record_failure(host, error)
+                
+                backoff = RETRY_BACKOFF * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+                if (not is_transient_error(e) or attempts > COLLECT_RETRIES
+                        or time.monotonic() + backoff + FETCH_MIN_TIMEOUT > deadline_at):
+                    return [], time.monotonic() - started, error, attempts
+                time.sleep(backoff)
 
     def get_test_articles(self, keywords: List[str]) -> List[Article]:
         """Retorna artigos de exemplo para teste"""
@@ -121,111 +1332,126 @@ class NewsCollector:
         
         return relevant_articles[:3]  # Retorna até 3 artigos de teste
 
-    def search_newsapi(self, keywords: List[str], hours: int) -> List[Article]:
-        """Busca via NewsAPI"""
+    def fetch_newsapi(self, keywords: List[str], hours: int, timeout: float = 10) -> List[Article]:
+        """Busca um grupo de palavras-chave no NewsAPI com uma única consulta OR (propaga erros)"""
         articles = []
-        from_date = (datetime.now() - timedelta(hours=hours)).isoformat()
+        from_date = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S')
+        query = plan_queries(keywords, QUERY_MAX_LENGTH['NewsAPI'])[0][0]
 
-        for keyword in keywords:
-            try:
-                url = f"https://newsapi.org/v2/everything"
-                params = {
-                    'q': keyword,
-                    'from': from_date,
-                    'sortBy': 'publishedAt',
-                    'language': 'pt',
-                    'apiKey': self.news_api_key
-                }
+        url = f"https://newsapi.org/v2/everything"
+        params = {
+            'q': query,
+            'from': from_date,
+            'sortBy': 'publishedAt',
+            'language': 'pt',
+            'pageSize': NEWSAPI_PAGE_SIZE,
+            'apiKey': self.news_api_key
+        }
 
-                response = requests.get(url, params=params)
-                data = response.json()
-
-                if data['status'] == 'ok':
-                    for item in data['articles'][:3]:
-                        article = Article(
-                            title=item['title'],
-                            url=item['url'],
-                            description=item['description'] or '',
-                            published_at=item['publishedAt'],
-                            source=f"NewsAPI - {item['source']['name']}"
-                        )
-                        articles.append(article)
-                        
-            except Exception as e:
-                print(f"Erro ao buscar no NewsAPI para '{keyword}': {e}")
+        response = http_client.get(url, params=params, timeout=timeout)
+        data = response.json()
+
+        if data['status'] != 'ok':
+            raise Exception(f"NewsAPI retornou status {data.get('code', data['status'])}")
+
+        for item in data['articles']:
+            if not item.get('title') or not item.get('url'):
+                continue
+            article = Article(
+                title=item['title'],
+                url=item['url'],
+                description=item['description'] or '',
+                published_at=item['publishedAt'],
+                source=f"NewsAPI - {item['source']['name']}",
+                keywords=match_keywords(f"{item['title']} {item['description'] or ''}", keywords)
+            )
+            articles.append(article)
         
         return articles
 
-    def search_google_news(self, keywords: List[str], hours: int) -> List[Article]:
-        """Busca no Google News via scraping"""
+    def fetch_google_news(self, keywords: List[str], hours: int = 24, timeout: float = 10) -> List[Article]:
+        """Busca um grupo de palavras-chave no RSS do Google News (consulta OR), com fallback para HTML"""
         articles = []
+        query = plan_queries(keywords, QUERY_MAX_LENGTH['Google News'])[0][0]
         
-        for keyword in keywords:
-            try:
-                # URL do Google News RSS (mais confiável)
-                search_url = f"https://news.google.com/rss/search?q={keyword}&hl=pt-BR&gl=BR&ceid=BR:pt-419"
+        try:
+            # URL do Google News RSS (mais confiável), já restrita à janela de tempo pedida
+            window = f"when:{hours}h" if hours <= 48 else f"when:{math.ceil(hours / 24)}d"
+            params = urlencode({'q': f"{query} {window}", 'hl': 'pt-BR', 'gl': 'BR', 'ceid': 'BR:pt-419'})
+            search_url = f"https://news.google.com/rss/search?{params}"
+            
+            # GET condicional: em 304 reaproveita os itens já processados
+            items = feed_cache.fetch(search_url, lambda content: self.parse_rss_items(content, limit=RSS_MAX_ITEMS),
+                                     headers=self.headers, timeout=timeout)
+            
+            if items is None:
+                # Fallback para método HTML se RSS falhar
+                return self.search_google_news_html(query, timeout=timeout)
+            
+            for item in items:
+                # Atribui o resultado às palavras-chave que ele realmente menciona
+                matched = match_keywords(f"{item['title']} {item['description']}", keywords)
                 
-                response = requests.get(search_url, headers=self.headers, timeout=10)
+                description = item['description']
+                if not description:
+                    description = f"Notícia sobre {(matched or keywords)[0]} encontrada no Google News"
                 
-                if response.status_code == 200:
-                    # Parse XML do RSS
-                    from xml.etree import ElementTree as ET
-                    root = ET.fromstring(response.content)
+                article = Article(
+                    title=item['title'],
+                    url=item['link'],
+                    description=description[:300],  # Limita descrição
+                    published_at=item['pub_date'],
+                    source="Google News",
+                    keywords=matched
+                )
+                articles.append(article)
                     
-                    for item in root.findall('.//item')[:3]:  # Pega primeiros 3 artigos
-                        try:
-                            title_elem = item.find('title')
-                            link_elem = item.find('link')
-                            desc_elem = item.find('description')
-                            pubdate_elem = item.find('pubDate')
-                            
-                            if title_elem is not None and link_elem is not None:
-                                title = title_elem.text.strip()
-                                url = link_elem.text.strip()
-                                
-                                # Limpa descrição HTML se existir
-                                description = ""
-                                if desc_elem is not None and desc_elem.text:
-                                    description = BeautifulSoup(desc_elem.text, 'html.parser').get_text().strip()
-                                
-                                if not description:
-                                    description = f"Notícia sobre {keyword} encontrada no Google News"
-                                
-                                # Data de publicação
-                                pub_date = pubdate_elem.text if pubdate_elem is not None else datetime.now().isoformat()
-                                
-                                article = Article(
-                                    title=title,
-                                    url=url,
-                                    description=description[:300],  # Limita descrição
-                                    published_at=pub_date,
-                                    source="Google News"
-                                )
-                                articles.append(article)
-                                
-                        except Exception as e:
-                            continue
-                else:
-                    # Fallback para método HTML se RSS falhar
-                    articles.extend(self.search_google_news_html(keyword))
-                        
-            except Exception as e:
-                print(f"Erro ao buscar no Google News para '{keyword}': {e}")
-                # Tenta método alternativo
-                try:
-                    articles.extend(self.search_google_news_html(keyword))
-                except:
-                    pass
+        except Exception as e:
+            # Tenta método alternativo; só reporta falha se ele também não trouxer nada
+            if is_transient_error(e):
+                raise  # O host não respondeu; o HTML viria do mesmo servidor
+            fallback = self.search_google_news_html(query, timeout=timeout)
+            if not fallback:
+                raise
+            return fallback
         
         return articles
 
-    def search_google_news_html(self, keyword: str) -> List[Article]:
+    @staticmethod
+    def parse_rss_items(content: bytes, limit: int = RSS_MAX_ITEMS) -> List[Dict[str, str]]:
+        """Extrai título, link, descrição limpa e data dos primeiros itens de um RSS"""
+        items = []
+        
+        for item in iter_rss_items(content, limit):
+            title_elem = item.find('title')
+            link_elem = item.find('link')
+            desc_elem = item.find('description')
+            pubdate_elem = item.find('pubDate')
+            
+            if title_elem is None or link_elem is None or not title_elem.text or not link_elem.text:
+                continue
+            
+            # Limpa descrição HTML se existir
+            description = ""
+            if desc_elem is not None and desc_elem.text:
+                description = strip_html(desc_elem.text)
+            
+            items.append({
+                'title': title_elem.text.strip(),
+                'link': link_elem.text.strip(),
+                'description': description,
+                'pub_date': pubdate_elem.text if pubdate_elem is not None else ''
+            })
+        
+        return items
+
+    def search_google_news_html(self, keyword: str, timeout: float = 10) -> List[Article]:
         """Método alternativo de busca no Google News via HTML"""
         articles = []
         try:
             search_url = f"https://news.google.com/search?q={keyword}&hl=pt-BR"
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            response = http_client.get(search_url, headers=self.headers, timeout=timeout)
+            soup = make_soup(response.content, 'google_html')
             
             # Busca por diferentes seletores de artigos
             selectors = [
@@ -259,7 +1485,7 @@ class NewsCollector:
                                 title=title,
                                 url=url,
                                 description=description,
-                                published_at=datetime.now().isoformat(),
+                                published_at='',  # A página não informa a data
                                 source="Google News"
                             )
                             articles.append(article)
@@ -278,191 +1504,344 @@ class NewsCollector:
             
         return articles
 
-    def search_bing_news(self, keywords: List[str], hours: int) -> List[Article]:
-        """Busca no Bing News com melhor extração de conteúdo"""
+    def fetch_bing_news(self, keyword: str, hours: int = 24, timeout: float = 10) -> List[Article]:
+        """Busca uma palavra-chave no Bing News (propaga erros de rede)"""
         articles = []
         
-        for keyword in keywords:
-            try:
-                # URL do Bing News melhorada
-                search_url = f"https://www.bing.com/news/search?q={keyword}&qft=interval%3D7&form=HDRSC4"
-                
-                response = requests.get(search_url, headers=self.headers, timeout=10)
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Múltiplos seletores para capturar artigos
-                selectors = [
-                    '.news-card',
-                    '.newsitem',
-                    'article',
-                    '.b_algo'
-                ]
-                
-                found_articles = 0
-                
-                for selector in selectors:
-                    if found_articles >= 3:
-                        break
-                        
-                    elements = soup.select(selector)[:5]
-                    
-                    for element in elements:
-                        if found_articles >= 3:
-                            break
-                            
-                        try:
-                            # Busca título em diferentes elementos
-                            title_element = (
-                                element.find('h2') or 
-                                element.find('h3') or 
-                                element.find('h4') or
-                                element.find('a', href=True)
-                            )
-                            
-                            if title_element:
-                                title = title_element.get_text().strip()
-                                
-                                # Busca link
-                                link_element = title_element if title_element.name == 'a' else title_element.find('a')
-                                if not link_element:
-                                    link_element = element.find('a', href=True)
-                                
-                                if link_element and title and len(title) > 10:
-                                    url = link_element.get('href', '')
-                                    
-                                    # Corrige URL se necessário
-                                    if url.startswith('/'):
-                                        url = f"https://www.bing.com{url}"
-                                    elif not url.startswith('http'):
-                                        continue
-                                    
-                                    # Busca descrição/snippet
-                                    desc_element = (
-                                        element.find('p') or
-                                        element.find('div', class_='snippet') or
-                                        element.find('.b_caption')
-                                    )
-                                    
-                                    if desc_element:
-                                        description = desc_element.get_text().strip()[:200]
-                                    else:
-                                        description = f"Notícia sobre {keyword} - {title[:100]}"
-                                    
-                                    # Remove descrições muito curtas ou genéricas
-                                    if len(description) < 30:
-                                        description = f"Artigo sobre {keyword}: {title[:150]}"
-                                    
-                                    article = Article(
-                                        title=title,
-                                        url=url,
-                                        description=description,
-                                        published_at=datetime.now().isoformat(),
-                                        source="Bing News"
-                                    )
-                                    articles.append(article)
-                                    found_articles += 1
-                                    
-                        except Exception as e:
-                            continue
-                        
-            except Exception as e:
-                print(f"Erro ao buscar no Bing News para '{keyword}': {e}")
+        # Filtro de período do Bing: 4 = última hora, 7 = 24 horas, 8 = 7 dias, 9 = 30 dias
+        interval = 4 if hours <= 1 else 7 if hours <= 24 else 8 if hours <= 168 else 9
         
-        return articles
-
-    def search_local_sites(self, keywords: List[str], hours: int) -> List[Article]:
-        """Busca em sites locais específicos do Litoral Norte Paulista"""
-        articles = []
+        # URL do Bing News melhorada
+        search_url = f"https://www.bing.com/news/search?q={quote_plus(keyword)}&qft=interval%3d%22{interval}%22&form=HDRSC4"
         
-        # Sites locais relevantes
-        local_sites = [
-            {
-                'name': 'Portal Ilhabela',
-                'url': 'https://www.portalilhabela.com.br',
-                'search_path': '/busca?q='
-            },
-            {
-                'name': 'São Sebastião Online', 
-                'url': 'https://www.saosebastiaoonline.com.br',
-                'search_path': '/search?q='
-            },
-            {
-                'name': 'Caraguá News',
-                'url': 'https://www.caraguanews.com.br', 
-                'search_path': '/busca?termo='
-            }
+        response = http_client.get(search_url, headers=self.headers, timeout=timeout)
+        response.raise_for_status()  # 4xx/5xx contam como falha do host no circuit breaker
+        
+        # Parsing parcial: só os cartões de notícia; se o layout mudar, cai no documento inteiro
+        soup = make_soup(response.content, 'bing', parse_only=BING_STRAINER)
+        if not soup.find():
+            soup = make_soup(response.content, 'bing')
+        
+        # Múltiplos seletores para capturar artigos
+        selectors = [
+            '.news-card',
+            '.newsitem',
+            'article',
+            '.b_algo'
         ]
         
-        for keyword in keywords:
-            for site in local_sites:
-                try:
-                    # Busca genérica no site
-                    search_url = f"{site['url']}{site['search_path']}{keyword}"
+        found_articles = 0
+        
+        for selector in selectors:
+            if found_articles >= 3:
+                break
+                
+            elements = soup.select(selector)[:5]
+            
+            for element in elements:
+                if found_articles >= 3:
+                    break
                     
-                    response = requests.get(search_url, headers=self.headers, timeout=10)
-                    soup = BeautifulSoup(response.content, 'html.parser')
+                try:
+                    # Busca título em diferentes elementos
+                    title_element = (
+                        element.find('h2') or 
+                        element.find('h3') or 
+                        element.find('h4') or
+                        element.find('a', href=True)
+                    )
                     
-                    # Procura por títulos e links de notícias
-                    for link in soup.find_all('a', href=True, limit=3):
-                        title = link.get_text().strip()
-                        if len(title) > 20 and any(kw.lower() in title.lower() for kw in keywords):
-                            url = link['href']
-                            if not url.startswith('http'):
-                                url = urljoin(site['url'], url)
+                    if title_element:
+                        title = title_element.get_text().strip()
+                        
+                        # Busca link
+                        link_element = title_element if title_element.name == 'a' else title_element.find('a')
+                        if not link_element:
+                            link_element = element.find('a', href=True)
+                        
+                        if link_element and title and len(title) > 10:
+                            url = link_element.get('href', '')
+                            
+                            # Corrige URL se necessário
+                            if url.startswith('/'):
+                                url = f"https://www.bing.com{url}"
+                            elif not url.startswith('http'):
+                                continue
+                            
+                            # Busca descrição/snippet
+                            desc_element = (
+                                element.find('p') or
+                                element.find('div', class_='snippet') or
+                                element.find('.b_caption')
+                            )
+                            
+                            if desc_element:
+                                description = desc_element.get_text().strip()[:200]
+                            else:
+                                description = f"Notícia sobre {keyword} - {title[:100]}"
+                            
+                            # Remove descrições muito curtas ou genéricas
+                            if len(description) < 30:
+                                description = f"Artigo sobre {keyword}: {title[:150]}"
                             
                             article = Article(
                                 title=title,
                                 url=url,
-                                description=title[:150],
-                                published_at=datetime.now().isoformat(),
-                                source=site['name']
+                                description=description,
+                                published_at='',  # A página não informa a data
+                                source="Bing News"
                             )
                             articles.append(article)
+                            found_articles += 1
                             
                 except Exception as e:
-                    print(f"Erro ao buscar em {site['name']} para '{keyword}': {e}")
+                    continue
         
         return articles
 
-class SEOGenerator:
-    def __init__(self):
-        # API key do Google Gemini
-        self.gemini_api_key = os.getenv('GEMINI_API_KEY', 'YOUR_GEMINI_API_KEY')
-
-    def generate_seo_content(self, article: Article) -> Dict[str, str]:
-        """Gera conteúdo SEO otimizado estruturado para WordPress"""
+    def fetch_local_page(self, site: Dict, page: str, keywords: List[str], timeout: float = 10) -> List[Article]:
+        """Baixa uma página (capa/seção) de um site local e compara todos os links com todas as
+        palavras-chave em uma única passada (propaga erros de rede)"""
+        articles = []
         
-        # Verifica se é sobre o Litoral Norte para otimizar o título
-        keywords_litoral = ["Litoral Norte", "Ilhabela", "São Sebastião", "Caraguatatuba", "Ubatuba"]
-        is_litoral_content = any(keyword.lower() in article.title.lower() for keyword in keywords_litoral)
+        response = http_client.get(urljoin(site['url'], page), headers=self.headers, timeout=timeout)
+        response.raise_for_status()  # 4xx/5xx contam como falha do host no circuit breaker
+        soup = make_soup(response.content, 'local', parse_only=LOCAL_STRAINER)
+        matcher, keyword_by_term = compile_keyword_matcher(keywords)
         
-        # Cria título principal otimizado (máximo 12 palavras)
-        original_words = article.title.split()[:12]
-        if is_litoral_content:
-            main_title = " ".join(original_words)
-        else:
-            # Adapta para Litoral Norte se não for regional
-            main_title = f"{' '.join(original_words[:10])} no Litoral Norte"
+        seen_urls = set()
+        for title, href in self.extract_site_links(site['name'], soup):
+            matched = list(dict.fromkeys(keyword_by_term[term] for term in matcher.findall(normalize_text(title))))
+            if not matched:
+                continue
+            
+            url = href if href.startswith('http') else urljoin(site['url'], href)
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            
+            article = Article(
+                title=title,
+                url=url,
+                description=title[:150],
+                published_at='',  # A capa não informa a data
+                source=site['name'],
+                keywords=matched
+            )
+            articles.append(article)
+        
+        return articles
+
+    def extract_site_links(self, site_name: str, soup: BeautifulSoup) -> List[Tuple[str, str]]:
+        """Extrai (título, href) dos links de notícia usando o seletor aprendido para o site"""
+        with self.selectors_lock:
+            cached = self.site_selectors.get(site_name)
+        selectors = [cached] + [s for s in LOCAL_LINK_SELECTORS if s != cached] if cached else LOCAL_LINK_SELECTORS
+        
+        links: List[Tuple[str, str]] = []
+        for selector in selectors:
+            links = [(link.get_text(' ', strip=True), link['href'])
+                     for link in soup.select(selector) if link.get('href')]
+            links = [(title, href) for title, href in links if len(title) > 20]
+            # Primeiro seletor que encontra uma lista de manchetes razoável
+            if len(links) >= 3:
+                if selector != cached:
+                    self.remember_site_selector(site_name, selector)
+                break
         
-        # Cria subtítulo baseado na descrição
-        subtitle = article.description[:100] + "..." if len(article.description) > 100 else article.description
+        return links
+
+    def remember_site_selector(self, site_name: str, selector: str):
+        with self.selectors_lock:
+            self.site_selectors[site_name] = selector
+            try:
+                os.makedirs(os.path.dirname(self.selectors_path) or '.', exist_ok=True)
+                with open(self.selectors_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.site_selectors, f, ensure_ascii=False)
+            except Exception as e:
+                print(f"⚠️ Erro ao salvar seletores dos sites locais: {e}")
+
+    def fetch_local_site(self, site: Dict[str, str], keyword: str, keywords: List[str],
+                         timeout: float = 10) -> List[Article]:
+        """Busca uma palavra-chave em um site local (propaga erros de rede)"""
+        articles = []
         
-        # Identifica a fonte para a estrutura final
-        source_name = self.extract_source_name(article.source, article.description)
+        # Busca genérica no site
+        search_url = f"{site['url']}{site['search_path']}{keyword}"
         
-        # Determina categoria e subcategoria WordPress
-        wp_category = self.determine_wordpress_category(article, is_litoral_content)
+        response = http_client.get(search_url, headers=self.headers, timeout=timeout)
+        soup = make_soup(response.content, 'local', parse_only=LINK_STRAINER)
         
-        # Gera conteúdo estruturado para WordPress
-        wordpress_content = self.create_wordpress_structure(article, main_title, subtitle, source_name, is_litoral_content)
+        # Procura por títulos e links de notícias
+        for link in soup.find_all('a', href=True, limit=3):
+            title = link.get_text().strip()
+            if len(title) > 20 and any(kw.lower() in title.lower() for kw in keywords):
+                url = link['href']
+                if not url.startswith('http'):
+                    url = urljoin(site['url'], url)
+                
+                article = Article(
+                    title=title,
+                    url=url,
+                    description=title[:150],
+                    published_at='',  # A busca não informa a data
+                    source=site['name']
+                )
+                articles.append(article)
         
-        # Meta description otimizada para WordPress
-        meta_desc = f"{subtitle[:150]} | Portal de notícias do Litoral Norte Paulista"
-        if len(subtitle) <= 120:
-            meta_desc = f"{subtitle} | Acompanhe as notícias de Ilhabela, São Sebastião, Caraguatatuba e Ubatuba"
+        return articles
 
-        # Para preview na interface web (mais visual)
-        preview_content = f"""
+# Modelo e configuração de geração do Gemini (também fazem parte da chave do cache)
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+GEMINI_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topK": 20,
+    "topP": 0.8,
+    "maxOutputTokens": 800
+}
+# Cotas da API (padrão do plano gratuito do gemini-1.5-flash) e concorrência das gerações em lote
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '15'))
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))
+GEMINI_MAX_WORKERS = int(os.getenv('GEMINI_MAX_WORKERS', '4'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+GEMINI_RETRY_BACKOFF = float(os.getenv('GEMINI_RETRY_BACKOFF', '2'))
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))
+# Notícias curtas (título + descrição até GEMINI_PACK_MAX_CHARS) vão juntas em um só prompt
+GEMINI_PACK_SIZE = int(os.getenv('GEMINI_PACK_SIZE', '4'))
+GEMINI_PACK_MAX_CHARS = int(os.getenv('GEMINI_PACK_MAX_CHARS', '600'))
+GEMINI_PACK_MARKER = "### NOTÍCIA"
+GEMINI_PACK_SPLIT_RE = re.compile(r'^\s*#*\s*\**NOT[IÍ]CIA\s+(\d+)\**\s*:?\s*$', re.MULTILINE | re.IGNORECASE)
+GEMINI_BATCH_MAX_ARTICLES = int(os.getenv('GEMINI_BATCH_MAX_ARTICLES', '30'))
+GEMINI_CACHE_TTL = float(os.getenv('GEMINI_CACHE_TTL', str(7 * 24 * 3600)))
+GEMINI_CACHE_MAX_BYTES = int(os.getenv('GEMINI_CACHE_MAX_MB', '50')) * 1024 * 1024
+
+class GenerationCache:
+    """Cache em disco das gerações do Gemini, endereçado pelo hash das entradas do prompt.
+    Um arquivo JSON por chave; o mtime do arquivo marca o último acesso (para o LRU)."""
+
+    def __init__(self, directory: str = os.path.join(DATA_DIR, 'gemini_cache'),
+                 ttl: float = GEMINI_CACHE_TTL, max_bytes: int = GEMINI_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        # chave -> [tamanho em bytes, último acesso]
+        self.index: Dict[str, list] = {}
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json'):
+                        info = entry.stat()
+                        self.index[entry.name[:-5]] = [info.st_size, info.st_mtime]
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def key_for(article: Article, is_litoral: bool, model: str = GEMINI_MODEL,
+                config: Optional[Dict] = None, variant: str = 'single') -> str:
+        """Hash das entradas que determinam o texto gerado; variant identifica o prompt
+        ('single' para uma notícia, 'pack' para o prompt agrupado)"""
+        material = json.dumps({
+            'title': article.title,
+            'description': article.description,
+            'source': article.source,
+            'is_litoral': is_litoral,
+            'variant': variant,
+            'model': model,
+            'config': config if config is not None else GEMINI_GENERATION_CONFIG
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if time.time() - entry.get('created_at', 0) > self.ttl:
+            self._remove(key)
+            with self.lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self.lock:
+            self.hits += 1
+            self.saved_seconds += entry.get('elapsed', 0)
+            if key in self.index:
+                self.index[key][1] = now
+        return entry['text']
+
+    def put(self, key: str, text: str, elapsed: float):
+        os.makedirs(self.directory, exist_ok=True)
+        data = json.dumps({'text': text, 'created_at': time.time(), 'elapsed': round(elapsed, 3)},
+                          ensure_ascii=False).encode('utf-8')
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.index[key] = [len(data), time.time()]
+            self._evict()
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.index.pop(key, None)
+
+    def _evict(self):
+        """Remove as entradas acessadas há mais tempo até caber no limite (chamado com o lock)"""
+        total = sum(size for size, _ in self.index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            del self.index[key]
+            total -= size
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'latency_saved_seconds': round(self.saved_seconds, 2),
+                'entries': len(self.index),
+                'bytes': sum(size for size, _ in self.index.values())
+            }
+
+gemini_cache = GenerationCache()
+
+# Templates pré-compilados dos formatos de saída (preview na interface, post WordPress e redes sociais)
+PREVIEW_TEMPLATE = Template("""
         <div class="card border-primary">
             <div class="card-header bg-primary text-white">
                 <h4 class="mb-0">📰 Conteúdo Pronto para WordPress</h4>
@@ -470,15 +1849,15 @@ class SEOGenerator:
             <div class="card-body">
                 <div class="alert alert-info mb-4">
                     <h6><i class="fas fa-info-circle me-2"></i>Configurações WordPress (não aparecem no artigo):</h6>
-                    <p class="mb-2"><strong>CATEGORIA:</strong> {wp_category['full_path']}</p>
-                    <p class="mb-2"><strong>META DESCRIÇÃO:</strong> {meta_desc}</p>
-                    <p class="mb-0"><strong>TAGS:</strong> {', '.join([tag.replace('<span class="badge bg-secondary me-1">', '').replace('</span>', '') for tag in self.generate_wordpress_tags(article, is_litoral_content).split()])}</p>
+                    <p class="mb-2"><strong>CATEGORIA:</strong> $category_path</p>
+                    <p class="mb-2"><strong>META DESCRIÇÃO:</strong> $meta_description</p>
+                    <p class="mb-0"><strong>TAGS:</strong> $tags_text</p>
                 </div>
 
                 <div class="mb-4">
                     <h5 class="text-primary">📋 Título do Post:</h5>
                     <div class="border p-2 bg-light">
-                        <span class="fw-bold text-dark">{main_title}</span>
+                        <span class="fw-bold text-dark">$main_title</span>
                     </div>
                 </div>
                 
@@ -490,16 +1869,16 @@ class SEOGenerator:
                         ✅ Apenas conteúdo editorial puro</small>
                     </div>
                     <div class="border p-3 bg-light" style="max-height: 400px; overflow-y: auto;">
-                        {wordpress_content}
+                        $wordpress_content
                     </div>
                 </div>
                 
                 <div class="mb-4">
                     <h5 class="text-primary">📸 Imagem Destacada:</h5>
-                    <img src="{self.get_featured_image(article, is_litoral_content)}" class="img-fluid rounded mb-2" alt="Imagem do artigo">
+                    <img src="$image_url" class="img-fluid rounded mb-2" alt="Imagem do artigo">
                     <div class="border p-2 bg-light">
                         <strong>Resumo da Imagem (configuração WordPress):</strong><br>
-                        <span class="text-muted">{meta_desc}</span>
+                        <span class="text-muted">$meta_description</span>
                     </div>
                 </div>
                 
@@ -507,7 +1886,7 @@ class SEOGenerator:
                     <h6>✅ Instruções WordPress:</h6>
                     <ul class="mb-0">
                         <li><strong>Título:</strong> Cole o título acima</li>
-                        <li><strong>Categoria:</strong> {wp_category['full_path']}</li>
+                        <li><strong>Categoria:</strong> $category_path</li>
                         <li><strong>Meta descrição:</strong> Cole na configuração SEO</li>
                         <li><strong>Imagem destacada:</strong> Adicione + resumo</li>
                         <li><strong>Conteúdo:</strong> Cole apenas o texto editorial</li>
@@ -517,47 +1896,159 @@ class SEOGenerator:
         </div>
         
         <div class="mt-3">
-            <a href="{article.url}" target="_blank" class="btn btn-outline-primary">
+            <a href="$article_url" target="_blank" class="btn btn-outline-primary">
                 <i class="fas fa-external-link-alt me-2"></i>Ver Artigo Original
             </a>
         </div>
-        """
+        """)
+
+WORDPRESS_TEMPLATE = Template("""<p><img src="$image_url" alt="Imagem relacionada à notícia" class="wp-image-featured aligncenter" /></p>
+<p><em>Imagem: Reprodução</em></p>
+
+$paragraphs
+
+<h2>Impacto Regional</h2>
+<p>Este desenvolvimento tem relevância para o Litoral Norte Paulista, região que compreende Ilhabela, São Sebastião, Caraguatatuba e Ubatuba. A população local acompanha atentamente informações que podem afetar o cotidiano da região.</p>
+
+<h2>Próximos Passos</h2>
+<p>O acompanhamento dos desdobramentos desta situação permanece em pauta para os órgãos competentes e comunidade local. Novas informações serão divulgadas conforme se tornarem disponíveis através dos canais oficiais.</p>
+
+<p><strong>Fonte:</strong> $source</p>""")
+
+TAG_BADGE_TEMPLATE = Template('<span class="badge bg-secondary me-1">$tag</span>')
+INSTAGRAM_CAPTION_TEMPLATE = Template("$title\n\n$description\n\n#LitoralNorte #SaoSebastiao #Ilhabela #Caraguatatuba #Ubatuba #Noticias #SaoPaulo")
+FACEBOOK_MESSAGE_TEMPLATE = Template("$title\n\n$description\n\n#LitoralNorte #Noticias")
+
+class ArticleAnalysis:
+    """Campos derivados de um artigo, cada um calculado uma única vez e só quando pedido"""
+
+    def __init__(self, generator: 'SEOGenerator', article: Article, use_gemini: bool = True,
+                 generated_paragraphs: Optional[str] = None):
+        self.generator = generator
+        self.article = article
+        self.use_gemini = use_gemini
+        self.generated_paragraphs = generated_paragraphs  # Já gerados em lote (ex.: GeminiScheduler)
+
+    @cached_property
+    def matches(self) -> EntityMatches:
+        # Uma única passada casa cidades, região, temas e órgãos para todos os campos abaixo
+        return entity_matcher.match(self.article.title, self.article.description)
+
+    @cached_property
+    def is_litoral(self) -> bool:
+        # Verifica se é sobre o Litoral Norte para otimizar o título
+        return bool(self.matches.values('region', where='title'))
+
+    @cached_property
+    def main_title(self) -> str:
+        # Cria título principal otimizado (máximo 12 palavras)
+        original_words = self.article.title.split()[:12]
+        if self.is_litoral:
+            return " ".join(original_words)
+        # Adapta para Litoral Norte se não for regional
+        return f"{' '.join(original_words[:10])} no Litoral Norte"
+
+    @cached_property
+    def subtitle(self) -> str:
+        description = self.article.description
+        return description[:100] + "..." if len(description) > 100 else description
+
+    @cached_property
+    def meta_description(self) -> str:
+        if len(self.subtitle) <= 120:
+            return f"{self.subtitle} | Acompanhe as notícias de Ilhabela, São Sebastião, Caraguatatuba e Ubatuba"
+        return f"{self.subtitle[:150]} | Portal de notícias do Litoral Norte Paulista"
+
+    @cached_property
+    def source_name(self) -> str:
+        return self.generator.extract_source_name(self.article.source, self.article.description, self.matches)
+
+    @cached_property
+    def wp_category(self) -> Dict[str, str]:
+        return self.generator.determine_wordpress_category(self.article, self.is_litoral, self.matches)
+
+    @cached_property
+    def image_url(self) -> str:
+        # Escolhida uma vez: preview, post e redes sociais usam a mesma imagem
+        return self.generator.get_featured_image(self.article, self.is_litoral, self.matches)
+
+    @cached_property
+    def tag_names(self) -> List[str]:
+        return self.generator.generate_tag_names(self.article, self.is_litoral, self.matches)
+
+    @cached_property
+    def tags_html(self) -> str:
+        return " ".join(TAG_BADGE_TEMPLATE.substitute(tag=tag) for tag in self.tag_names)
+
+    @cached_property
+    def paragraphs(self) -> str:
+        if self.generated_paragraphs is not None:
+            return self.generated_paragraphs
+        return self.generator.generate_article_paragraphs(self.article, self.is_litoral, self.use_gemini)
+
+    @cached_property
+    def wordpress_content(self) -> str:
+        # Conteúdo 100% limpo para WordPress - SEM meta descrição, categorias ou tags
+        return WORDPRESS_TEMPLATE.substitute(image_url=self.image_url, paragraphs=self.paragraphs,
+                                             source=self.source_name)
 
-        seo_content = {
-            'title': f"{main_title} | Portal Litoral Norte",
-            'content': preview_content,
-            'wordpress_content': wordpress_content,  # Conteúdo específico para WordPress
-            'meta_description': meta_desc,
-            'image_url': self.get_featured_image(article, is_litoral_content),
-            'tags': self.generate_wordpress_tags(article, is_litoral_content),
-            'source': source_name,
-            'wp_category': wp_category,  # Categoria para WordPress
-            'clean_title': main_title,  # Título limpo sem "| Portal"
-            'image_alt': meta_desc  # Alt text para imagem
+    @cached_property
+    def preview_html(self) -> str:
+        # Para preview na interface web (mais visual)
+        return PREVIEW_TEMPLATE.substitute(
+            category_path=self.wp_category['full_path'],
+            meta_description=self.meta_description,
+            tags_text=', '.join(self.tag_names),
+            main_title=self.main_title,
+            wordpress_content=self.wordpress_content,
+            image_url=self.image_url,
+            article_url=self.article.url
+        )
+
+    def to_content(self, render_preview: bool = True) -> Dict:
+        """Dicionário consumido pela interface e pelos publicadores"""
+        return {
+            'title': f"{self.main_title} | Portal Litoral Norte",
+            'content': self.preview_html if render_preview else self.wordpress_content,
+            'wordpress_content': self.wordpress_content,  # Conteúdo específico para WordPress
+            'meta_description': self.meta_description,
+            'image_url': self.image_url,
+            'tags': self.tags_html,
+            'tag_names': self.tag_names,  # Lista pura (evita reextrair do HTML das badges)
+            'source': self.source_name,
+            'wp_category': self.wp_category,  # Categoria para WordPress
+            'clean_title': self.main_title,  # Título limpo sem "| Portal"
+            'image_alt': self.meta_description,  # Alt text para imagem
+            'source_url': self.article.url  # URL original (controle de artigos já publicados)
         }
 
-        return seo_content
+class SEOGenerator:
+    def __init__(self):
+        # API key do Google Gemini
+        self.gemini_api_key = os.getenv('GEMINI_API_KEY', 'YOUR_GEMINI_API_KEY')
+
+    def gemini_enabled(self) -> bool:
+        return bool(self.gemini_api_key) and self.gemini_api_key != 'YOUR_GEMINI_API_KEY'
+
+    def generate_seo_content(self, article: Article, use_gemini: bool = True,
+                             render_preview: bool = True, paragraphs: Optional[str] = None) -> Dict[str, str]:
+        """Gera conteúdo SEO otimizado estruturado para WordPress (use_gemini=False usa só o texto padrão;
+        render_preview=False pula o HTML de preview da interface, como no modo automático;
+        paragraphs reaproveita texto já gerado, sem nova consulta ao cache do Gemini)"""
+        return ArticleAnalysis(self, article, use_gemini, paragraphs).to_content(render_preview)
 
-    def determine_wordpress_category(self, article: Article, is_litoral: bool) -> Dict[str, str]:
+    def determine_wordpress_category(self, article: Article, is_litoral: bool,
+                                     matches: Optional[EntityMatches] = None) -> Dict[str, str]:
         """Determina categoria e subcategoria para WordPress baseado no conteúdo"""
         
         # Analisa o texto completo (título + descrição)
-        full_text = f"{article.title} {article.description}".lower()
-        
-        # Verifica menção específica das cidades do Litoral Norte
-        cities = {
-            "ilhabela": "Ilhabela",
-            "são sebastião": "São Sebastião", 
-            "caraguatatuba": "Caraguatatuba",
-            "ubatuba": "Ubatuba"
-        }
+        if matches is None:
+            matches = entity_matcher.match(article.title, article.description)
         
-        # Procura por cidades mencionadas
-        mentioned_city = None
-        for city_key, city_name in cities.items():
-            if city_key in full_text:
-                mentioned_city = city_name
-                break
+        # Procura por cidades do Litoral Norte mencionadas (na ordem de prioridade)
+        cities = matches.values('city')
+        mentioned_city = cities[0] if cities else None
+        scopes = matches.values('scope')
         
         # Define categoria principal baseada no conteúdo
         if mentioned_city:
@@ -573,13 +2064,13 @@ class SEOGenerator:
                 "subcategory": "Litoral Norte",
                 "full_path": "Cidades > Litoral Norte"
             }
-        elif any(keyword in full_text for keyword in ["brasil", "federal", "nacional", "país"]):
+        elif "Brasil" in scopes:
             return {
                 "main_category": "Brasil",
                 "subcategory": "",
                 "full_path": "Brasil"
             }
-        elif any(keyword in full_text for keyword in ["internacional", "mundial", "exterior", "país"]):
+        elif "Mundo" in scopes:
             return {
                 "main_category": "Mundo", 
                 "subcategory": "",
@@ -593,62 +2084,38 @@ class SEOGenerator:
                 "full_path": "Destaque"
             }
 
-    def extract_source_name(self, source: str, description: str) -> str:
+    def extract_source_name(self, source: str, description: str,
+                            matches: Optional[EntityMatches] = None) -> str:
         """Extrai e formata o nome da fonte adequadamente"""
         
+        source_matches = entity_matcher.match(source)
+        if matches is None:
+            matches = entity_matcher.match('', description)
+        source_agencies = source_matches.values('agency')
+        
         # Padrões comuns de fontes
-        if "prefeitura" in source.lower() or "prefeitura" in description.lower():
+        if "Prefeitura Municipal" in source_agencies or "Prefeitura Municipal" in matches.values('agency', where='description'):
             # Identifica qual prefeitura
-            cities = ["Ilhabela", "São Sebastião", "Caraguatatuba", "Ubatuba"]
-            for city in cities:
-                if city.lower() in description.lower() or city.lower() in source.lower():
+            mentioned = set(matches.values('city', where='description')) | set(source_matches.values('city'))
+            for city in LITORAL_CITIES:
+                if city in mentioned:
                     return f"Prefeitura de {city}"
             return "Prefeitura Municipal"
         
-        if "bombeiros" in source.lower():
-            return "Corpo de Bombeiros"
-        
-        if "polícia" in source.lower():
-            return "Polícia Civil"
-        
-        if "governo" in source.lower():
-            return "Governo do Estado de São Paulo"
-        
-        if "saúde" in source.lower():
-            return "Secretaria de Saúde"
+        # Bombeiros, Polícia, Governo e Saúde (nessa ordem) a partir do nome da fonte
+        if source_agencies:
+            return source_agencies[0]
         
         # Remove prefixos comuns de agregadores
         clean_source = source.replace("Google News", "").replace("Bing News", "").replace("NewsAPI -", "").strip()
         
         return clean_source if clean_source else "Assessoria de Imprensa"
 
-    def create_wordpress_structure(self, article: Article, title: str, subtitle: str, source: str, is_litoral: bool) -> str:
-        """Cria estrutura completamente limpa do artigo para WordPress - apenas conteúdo editorial"""
-        
-        # Gera parágrafos baseados na descrição
-        paragraphs = self.generate_article_paragraphs(article, is_litoral)
-        
-        # Conteúdo 100% limpo para WordPress - SEM meta descrição, categorias ou tags
-        wordpress_html = f"""<p><img src="{self.get_featured_image(article, is_litoral)}" alt="Imagem relacionada à notícia" class="wp-image-featured aligncenter" /></p>
-<p><em>Imagem: Reprodução</em></p>
-
-{paragraphs}
-
-<h2>Impacto Regional</h2>
-<p>Este desenvolvimento tem relevância para o Litoral Norte Paulista, região que compreende Ilhabela, São Sebastião, Caraguatatuba e Ubatuba. A população local acompanha atentamente informações que podem afetar o cotidiano da região.</p>
-
-<h2>Próximos Passos</h2>
-<p>O acompanhamento dos desdobramentos desta situação permanece em pauta para os órgãos competentes e comunidade local. Novas informações serão divulgadas conforme se tornarem disponíveis através dos canais oficiais.</p>
-
-<p><strong>Fonte:</strong> {source}</p>"""
-        
-        return wordpress_html
-
-    def generate_article_paragraphs(self, article: Article, is_litoral: bool) -> str:
+    def generate_article_paragraphs(self, article: Article, is_litoral: bool, use_gemini: bool = True) -> str:
         """Gera parágrafos estruturados do artigo usando Gemini AI"""
         
         # Se Gemini API está configurada, usa IA para gerar conteúdo mais rico
-        if self.gemini_api_key and self.gemini_api_key != 'YOUR_GEMINI_API_KEY':
+        if use_gemini and self.gemini_enabled():
             try:
                 return self.generate_with_gemini(article, is_litoral)
             except Exception as e:
@@ -675,12 +2142,32 @@ class SEOGenerator:
 
     def generate_with_gemini(self, article: Article, is_litoral: bool) -> str:
         """Gera conteúdo usando Google Gemini AI"""
-        import requests
-        
-        # Prompt otimizado para o Gemini
-        region_context = "do Litoral Norte Paulista (Ilhabela, São Sebastião, Caraguatatuba e Ubatuba)" if is_litoral else "que pode impactar o Litoral Norte Paulista"
+
+        # Mesmas entradas, mesmo texto: evita nova chamada (e cota) para artigos já gerados
+        cache_key = gemini_cache.key_for(article, is_litoral)
+        cached = gemini_cache.get(cache_key)
+        if cached is not None:
+            print("⚡ Conteúdo Gemini reaproveitado do cache")
+            return cached
+        return self._gemini_generate(article, is_litoral, cache_key)
+
+    def _gemini_generate(self, article: Article, is_litoral: bool, cache_key: str) -> str:
+        """Chama o Gemini (pelo agendador, respeitando a cota) e guarda o resultado no cache"""
+        started = time.monotonic()
+        generated_text = gemini_scheduler.request(self.build_gemini_prompt(article, is_litoral))
+        paragraphs = self.format_gemini_paragraphs(generated_text)
+        gemini_cache.put(cache_key, paragraphs, time.monotonic() - started)
+        print("✅ Conteúdo gerado com Gemini AI")
+        return paragraphs
+
+    def gemini_region_context(self, is_litoral: bool) -> str:
+        return "do Litoral Norte Paulista (Ilhabela, São Sebastião, Caraguatatuba e Ubatuba)" if is_litoral else "que pode impactar o Litoral Norte Paulista"
+
+    def build_gemini_prompt(self, article: Article, is_litoral: bool) -> str:
+        """Prompt otimizado para o Gemini"""
+        region_context = self.gemini_region_context(is_litoral)
         
-        prompt = f"""
+        return f"""
         Você é um jornalista experiente especializado em notícias do Litoral Norte Paulista.
         
         Baseado nesta notícia:
@@ -697,47 +2184,45 @@ class SEOGenerator:
         Use apenas tags <p> e mantenha linguagem jornalística neutra e profissional.
         Cada parágrafo deve ter entre 60-100 palavras.
         """
+
+    def build_gemini_pack_prompt(self, items: List[Tuple[Article, bool]]) -> str:
+        """Um único prompt com várias notícias curtas; cada resposta vem após um marcador numerado"""
+        news_blocks = "\n".join(
+            f"""
+        {GEMINI_PACK_MARKER} {number}
+        Título: {article.title}
+        Descrição: {article.description}
+        Fonte: {article.source}
+        Abordagem: artigo jornalístico {self.gemini_region_context(is_litoral)}
+        """ for number, (article, is_litoral) in enumerate(items, 1))
         
-        # API do Google Gemini
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={self.gemini_api_key}"
+        return f"""
+        Você é um jornalista experiente especializado em notícias do Litoral Norte Paulista.
         
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 20,
-                "topP": 0.8,
-                "maxOutputTokens": 800
-            }
-        }
+        Para CADA uma das {len(items)} notícias abaixo, escreva 3 parágrafos em HTML:
         
-        headers = {
-            "Content-Type": "application/json"
-        }
+        1. Primeiro parágrafo: Desenvolva o lead da notícia
+        2. Segundo parágrafo: Contextualize a importância para a região
+        3. Terceiro parágrafo: Mencione próximos passos ou impactos
         
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        Use apenas tags <p> e mantenha linguagem jornalística neutra e profissional.
+        Cada parágrafo deve ter entre 60-100 palavras.
+        Comece a resposta de cada notícia com uma linha contendo apenas "{GEMINI_PACK_MARKER} N",
+        onde N é o número da notícia, e não escreva nada fora dessas seções.
+        {news_blocks}
+        """
+
+    def format_gemini_paragraphs(self, generated_text: str) -> str:
+        """Limpa e formata o texto gerado"""
+        paragraphs = generated_text.strip()
         
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                generated_text = result['candidates'][0]['content']['parts'][0]['text']
-                
-                # Limpa e formata o texto gerado
-                paragraphs = generated_text.strip()
-                
-                # Garante que está em formato HTML
-                if not paragraphs.startswith('<p>'):
-                    # Converte texto simples para HTML
-                    lines = paragraphs.split('\n\n')
-                    paragraphs = '\n\n'.join([f'<p>{line.strip()}</p>' for line in lines if line.strip()])
-                
-                print("✅ Conteúdo gerado com Gemini AI")
-                return paragraphs
+        # Garante que está em formato HTML
+        if not paragraphs.startswith('<p>'):
+            # Converte texto simples para HTML
+            lines = paragraphs.split('\n\n')
+            paragraphs = '\n\n'.join([f'<p>{line.strip()}</p>' for line in lines if line.strip()])
         
-        # Se falhar, retorna erro para usar fallback
-        raise Exception(f"Gemini API retornou status {response.status_code}")
+        return paragraphs
     
     def expand_content_with_gemini(self, article: Article, base_content: str) -> str:
         """Expande conteúdo existente usando Gemini (método auxiliar)"""
@@ -778,7 +2263,8 @@ class SEOGenerator:
         <p><em>Imagem: Reprodução</em></p>
         """
 
-    def get_featured_image(self, article: Article, is_litoral: bool) -> str:
+    def get_featured_image(self, article: Article, is_litoral: bool,
+                           matches: Optional[EntityMatches] = None) -> str:
         """Retorna URL de imagem adequada baseada no conteúdo"""
         
         # URLs de imagens padrão baseadas no tema
@@ -789,71 +2275,55 @@ class SEOGenerator:
         ]
         
         city_images = {
-            "ilhabela": "https://images.unsplash.com/photo-1559827260-dc66d52bef19?w=800&h=400&fit=crop",
-            "são sebastião": "https://images.unsplash.com/photo-1516815231560-8f41ec531527?w=800&h=400&fit=crop", 
-            "caraguatatuba": "https://images.unsplash.com/photo-1544551763-46a013bb7f074e?w=800&h=400&fit=crop",
-            "ubatuba": "https://images.unsplash.com/photo-1502781252888-9143ba7f074e?w=800&h=400&fit=crop"
+            "Ilhabela": "https://images.unsplash.com/photo-1559827260-dc66d52bef19?w=800&h=400&fit=crop",
+            "São Sebastião": "https://images.unsplash.com/photo-1516815231560-8f41ec531527?w=800&h=400&fit=crop", 
+            "Caraguatatuba": "https://images.unsplash.com/photo-1544551763-46a013bb7f074e?w=800&h=400&fit=crop",
+            "Ubatuba": "https://images.unsplash.com/photo-1502781252888-9143ba7f074e?w=800&h=400&fit=crop"
         }
         
-        # Verifica se menciona cidade específica
-        title_lower = article.title.lower()
-        for city, image_url in city_images.items():
-            if city in title_lower:
-                return image_url
+        # Verifica se menciona cidade específica no título
+        if matches is None:
+            matches = entity_matcher.match(article.title, article.description)
+        title_cities = matches.values('city', where='title')
+        if title_cities:
+            return city_images[title_cities[0]]
         
         # Retorna imagem padrão do litoral
         import random
         return random.choice(litoral_images)
 
-    def generate_wordpress_tags(self, article: Article, is_litoral: bool) -> str:
-        """Gera tags para WordPress"""
+    def generate_wordpress_tags(self, article: Article, is_litoral: bool,
+                                matches: Optional[EntityMatches] = None) -> str:
+        """Gera tags para WordPress formatadas como badges"""
+        tag_names = self.generate_tag_names(article, is_litoral, matches)
+        return " ".join(TAG_BADGE_TEMPLATE.substitute(tag=tag) for tag in tag_names)
+
+    def generate_tag_names(self, article: Article, is_litoral: bool,
+                           matches: Optional[EntityMatches] = None) -> List[str]:
+        """Gera a lista de nomes de tags para WordPress"""
         
         base_tags = ["Litoral Norte", "São Paulo", "Notícias"]
+        if matches is None:
+            matches = entity_matcher.match(article.title, article.description)
         
-        # Adiciona cidades do Litoral Norte
-        cities = ["Ilhabela", "São Sebastião", "Caraguatatuba", "Ubatuba"]
-        title_lower = article.title.lower()
-        
-        for city in cities:
-            if city.lower() in title_lower:
-                base_tags.append(city)
+        # Adiciona cidades do Litoral Norte citadas no título
+        base_tags.extend(matches.values('city', where='title'))
         
         # Adiciona tags baseadas no conteúdo
-        content_keywords = self.extract_content_keywords(article)
+        content_keywords = self.extract_content_keywords(article, matches)
         base_tags.extend(content_keywords)
         
         # Remove duplicatas e limita a 8 tags
-        unique_tags = list(dict.fromkeys(base_tags))[:8]
-        
-        # Formata as tags como badges
-        tag_badges = []
-        for tag in unique_tags:
-            tag_badges.append(f'<span class="badge bg-secondary me-1">{tag}</span>')
-        
-        return " ".join(tag_badges)
+        return list(dict.fromkeys(base_tags))[:8]
 
-    def extract_content_keywords(self, article: Article) -> List[str]:
+    def extract_content_keywords(self, article: Article,
+                                 matches: Optional[EntityMatches] = None) -> List[str]:
         """Extrai palavras-chave relevantes do conteúdo"""
         
-        keywords = []
-        text = f"{article.title} {article.description}".lower()
-        
-        # Palavras-chave temáticas
-        themes = {
-            "turismo": ["turismo", "turista", "visitante", "hotel", "pousada"],
-            "meio ambiente": ["meio ambiente", "preservação", "natureza", "sustentabilidade"],
-            "saúde": ["saúde", "hospital", "médico", "tratamento"],
-            "educação": ["educação", "escola", "universidade", "ensino"],
-            "segurança": ["segurança", "polícia", "bombeiros", "emergência"],
-            "infraestrutura": ["obra", "construção", "estrada", "ponte"],
-            "eventos": ["evento", "festival", "show", "apresentação"]
-        }
-        
-        for theme, words in themes.items():
-            if any(word in text for word in words):
-                keywords.append(theme.title())
-        
-        return keywords
+        # Palavras-chave temáticas (ENTITY_DICTIONARIES['theme']) no título + descrição
+        if matches is None:
+            matches = entity_matcher.match(article.title, article.description)
+        return matches.values('theme')
 
     def format_date(self, date_str: str) -> str:
         """Formata data para exibição em português"""
@@ -874,11 +2344,798 @@ class SEOGenerator:
         # Implementação básica - pode ser melhorada com web scraping
         return "https://via.placeholder.com/800x400/0066cc/ffffff?text=Imagem+do+Artigo"
 
+class TokenBucket:
+    """Balde de fichas por minuto: acquire() bloqueia até haver fichas suficientes"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """Consome as fichas e retorna quanto tempo esperou por elas"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait_time = (amount - self.tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def drain(self):
+        """Zera o balde (após um 429 todos os workers esperam a reposição)"""
+        with self.lock:
+            self._refill()
+            self.tokens = 0.0
+
+class GeminiScheduler:
+    """Executa gerações do Gemini em paralelo sob limites de requisições e tokens por minuto,
+    com nova tentativa em 429 e empacotamento de notícias curtas em um só prompt"""
+
+    def __init__(self, generator: SEOGenerator):
+        self.generator = generator
+        self.request_bucket = TokenBucket(GEMINI_RPM)
+        self.token_bucket = TokenBucket(GEMINI_TPM)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.packed_requests = 0
+        self.packed_articles = 0
+        self.throttled_seconds = 0.0
+
+    def request(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        """Uma chamada generateContent respeitando a cota; retorna o texto gerado"""
+        config = generation_config or GEMINI_GENERATION_CONFIG
+        # Estimativa grosseira: ~4 caracteres por token de entrada + o máximo de saída
+        estimated_tokens = len(prompt) / 4 + config.get('maxOutputTokens', 800)
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={self.generator.gemini_api_key}"
+        payload = {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }],
+            "generationConfig": config
+        }
+
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            waited = self.request_bucket.acquire() + self.token_bucket.acquire(estimated_tokens)
+            with self.lock:
+                self.requests += 1
+                self.throttled_seconds += waited
+
+            response = http_client.post(url, json=payload, headers={"Content-Type": "application/json"},
+                                        timeout=GEMINI_TIMEOUT)
+
+            if response.status_code in (429, 503) and attempt < GEMINI_MAX_RETRIES:
+                self.request_bucket.drain()
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else GEMINI_RETRY_BACKOFF * (2 ** attempt) + random.uniform(0, 1)
+                print(f"⏳ Gemini retornou {response.status_code}, nova tentativa em {delay:.1f}s")
+                with self.lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 200:
+                result = response.json()
+                if 'candidates' in result and len(result['candidates']) > 0:
+                    return result['candidates'][0]['content']['parts'][0]['text']
+
+            # Se falhar, retorna erro para usar fallback
+            raise Exception(f"Gemini API retornou status {response.status_code}")
+
+    def generate_many(self, articles: List[Article]) -> List[Dict]:
+        """Gera os parágrafos de vários artigos; retorna, na mesma ordem, um dict com
+        paragraphs (None em caso de erro), cached, packed e error"""
+        results: List[Optional[Dict]] = [None] * len(articles)
+        pending = []
+
+        for index, article in enumerate(articles):
+            if not self.generator.gemini_enabled():
+                results[index] = {'paragraphs': None, 'cached': False, 'packed': False, 'error': 'Gemini não configurado'}
+                continue
+            is_litoral = bool(entity_matcher.match(article.title).values('region', where='title'))
+            cache_key = gemini_cache.key_for(article, is_litoral)
+            cached = gemini_cache.get(cache_key)
+            if cached is not None:
+                results[index] = {'paragraphs': cached, 'cached': True, 'packed': False, 'error': None}
+                continue
+            # Em lote também serve o texto de uma geração agrupada anterior
+            cached = gemini_cache.get(self._pack_key(article, is_litoral))
+            if cached is not None:
+                results[index] = {'paragraphs': cached, 'cached': True, 'packed': True, 'error': None}
+            else:
+                pending.append((index, article, is_litoral, cache_key))
+
+        # Notícias longas vão sozinhas; as curtas são agrupadas até GEMINI_PACK_SIZE por prompt
+        short = [item for item in pending if len(item[1].title) + len(item[1].description) <= GEMINI_PACK_MAX_CHARS]
+        units = [[item] for item in pending if item not in short]
+        pack_size = max(1, GEMINI_PACK_SIZE)
+        units.extend(short[i:i + pack_size] for i in range(0, len(short), pack_size))
+
+        if units:
+            with ThreadPoolExecutor(max_workers=min(GEMINI_MAX_WORKERS, len(units))) as executor:
+                for future in as_completed([executor.submit(self._run_unit, unit) for unit in units]):
+                    for index, result in future.result().items():
+                        results[index] = result
+
+        return results
+
+    @staticmethod
+    def _pack_key(article: Article, is_litoral: bool) -> str:
+        """Chave de cache das notícias geradas pelo prompt agrupado. O limite de tokens cresce
+        com o tamanho do grupo, então a configuração por notícia é a base."""
+        return gemini_cache.key_for(article, is_litoral, config=GEMINI_GENERATION_CONFIG, variant='pack')
+
+    def _run_unit(self, unit: List[Tuple]) -> Dict[int, Dict]:
+        results = {}
+
+        if len(unit) > 1:
+            try:
+                texts = self._generate_pack(unit)
+            except Exception as e:
+                print(f"⚠️ Geração agrupada falhou, gerando individualmente: {e}")
+                texts = {}
+            for index, *_ in unit:
+                if index in texts:
+                    results[index] = {'paragraphs': texts[index], 'cached': False, 'packed': True, 'error': None}
+            # Notícias que não vieram na resposta agrupada são geradas uma a uma
+            unit = [item for item in unit if item[0] not in results]
+
+        for index, article, is_litoral, cache_key in unit:
+            try:
+                paragraphs = self.generator._gemini_generate(article, is_litoral, cache_key)
+                results[index] = {'paragraphs': paragraphs, 'cached': False, 'packed': False, 'error': None}
+            except Exception as e:
+                print(f"Erro ao usar Gemini AI: {e}")
+                results[index] = {'paragraphs': None, 'cached': False, 'packed': False, 'error': str(e)}
+
+        return results
+
+    def _generate_pack(self, unit: List[Tuple]) -> Dict[int, str]:
+        """Gera várias notícias em uma chamada e separa a resposta pelos marcadores numerados"""
+        started = time.monotonic()
+        prompt = self.generator.build_gemini_pack_prompt([(article, is_litoral) for _, article, is_litoral, _ in unit])
+        config = dict(GEMINI_GENERATION_CONFIG,
+                      maxOutputTokens=min(8192, GEMINI_GENERATION_CONFIG['maxOutputTokens'] * len(unit)))
+        generated_text = self.request(prompt, config)
+
+        sections = GEMINI_PACK_SPLIT_RE.split(generated_text)
+        # re.split alterna [texto antes, número, seção, número, seção, ...]
+        by_number = {int(number): body for number, body in zip(sections[1::2], sections[2::2]) if body.strip()}
+
+        texts = {}
+        elapsed_each = (time.monotonic() - started) / len(unit)
+        for number, (index, article, is_litoral, _) in enumerate(unit, 1):
+            if number in by_number:
+                paragraphs = self.generator.format_gemini_paragraphs(by_number[number])
+                gemini_cache.put(self._pack_key(article, is_litoral), paragraphs, elapsed_each)
+                texts[index] = paragraphs
+
+        with self.lock:
+            self.packed_requests += 1
+            self.packed_articles += len(texts)
+        print(f"✅ {len(texts)}/{len(unit)} notícias geradas com Gemini AI em uma única chamada")
+        return texts
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'packed_requests': self.packed_requests,
+                'packed_articles': self.packed_articles,
+                'throttled_seconds': round(self.throttled_seconds, 2),
+                'rpm': GEMINI_RPM,
+                'tpm': GEMINI_TPM
+            }
+
+# Índice local de tags: sincronização incremental frequente e completa (pega renomeações/exclusões) diária
+WP_TAG_REFRESH_SECONDS = float(os.getenv('WP_TAG_REFRESH_SECONDS', '3600'))
+WP_TAG_FULL_SYNC_SECONDS = float(os.getenv('WP_TAG_FULL_SYNC_SECONDS', str(24 * 3600)))
+WP_TAG_CREATE_WORKERS = int(os.getenv('WP_TAG_CREATE_WORKERS', '4'))
+
+def wp_slug(name: str) -> str:
+    """Aproximação do sanitize_title do WordPress (sem acentos, minúsculas, hífens)"""
+    return normalize_text(name).replace(' ', '-')
+
+class WordPressTagIndex:
+    """Índice local nome/slug -> ID das tags do WordPress, persistido em disco.
+    Tags recorrentes ("Litoral Norte", "Ilhabela", ...) são resolvidas sem nenhuma chamada de rede."""
+
+    def __init__(self, wp_url: str, path: str = os.path.join(DATA_DIR, 'wp_tags.json')):
+        self.wp_url = wp_url
+        self.path = path
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.sync_lock = threading.Lock()  # Uma sincronização por vez, mesmo com vários posts em paralelo
+        self.by_name: Dict[str, int] = {}
+        self.by_slug: Dict[str, int] = {}
+        self.max_id = 0
+        self.synced_at = 0.0
+        self.full_synced_at = 0.0
+        # Criações em andamento: nome -> Future com o ID (coalesce criações simultâneas da mesma tag)
+        self.inflight: Dict[str, Future] = {}
+        self.lookups = 0
+        self.network_calls = 0
+        self.created = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('wp_url') != self.wp_url:
+                return
+            for tag in data.get('tags', []):
+                self._add(tag['id'], tag['name'], tag.get('slug'))
+            self.synced_at = data.get('synced_at', 0.0)
+            self.full_synced_at = data.get('full_synced_at', 0.0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Índice de tags ignorado ({e})")
+
+    def _save(self):
+        with self.lock:
+            names_by_id = {tag_id: name for name, tag_id in self.by_name.items()}
+            slugs_by_id = {tag_id: slug for slug, tag_id in self.by_slug.items()}
+            data = {
+                'wp_url': self.wp_url,
+                'synced_at': self.synced_at,
+                'full_synced_at': self.full_synced_at,
+                'tags': [{'id': tag_id, 'name': name, 'slug': slugs_by_id.get(tag_id)}
+                         for tag_id, name in names_by_id.items()]
+            }
+        try:
+            with self.save_lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Erro ao salvar índice de tags: {e}")
+
+    def _add(self, tag_id: int, name: str, slug: Optional[str] = None):
+        """Registra uma tag (chamado com ou sem o lock; só faz atribuições em dicts)"""
+        self.by_name[html.unescape(name).strip().lower()] = tag_id
+        self.by_slug[slug or wp_slug(name)] = tag_id
+        self.max_id = max(self.max_id, tag_id)
+
+    def lookup(self, name: str) -> Optional[int]:
+        with self.lock:
+            return self.by_name.get(name.strip().lower()) or self.by_slug.get(wp_slug(name))
+
+    def sync(self, headers: Dict[str, str], full: bool = False) -> bool:
+        """Baixa as tags paginadas (per_page=100). No modo incremental percorre por ID decrescente
+        e para ao alcançar a maior ID já conhecida."""
+        full = full or not self.full_synced_at
+        url = f"{self.wp_url}/wp-json/wp/v2/tags"
+        params = {'per_page': 100, '_fields': 'id,name,slug', 'orderby': 'id', 'order': 'desc'}
+        known_max_id = self.max_id
+        fetched = []
+        page = 1
+
+        try:
+            while True:
+                response = http_client.get(url, params=dict(params, page=page), headers=headers, timeout=15)
+                with self.lock:
+                    self.network_calls += 1
+                if response.status_code != 200:
+                    print(f"⚠️ Erro ao sincronizar tags do WordPress: {response.status_code}")
+                    return False
+
+                tags = response.json()
+                fetched.extend(tags)
+                total_pages = int(response.headers.get('X-WP-TotalPages', '1') or 1)
+                reached_known = not full and any(tag['id'] <= known_max_id for tag in tags)
+                if not tags or reached_known or page >= total_pages:
+                    break
+                page += 1
+        except Exception as e:
+            print(f"⚠️ Erro ao sincronizar tags do WordPress: {e}")
+            return False
+
+        with self.lock:
+            if full:
+                self.by_name.clear()
+                self.by_slug.clear()
+                self.max_id = 0
+                self.full_synced_at = time.time()
+            for tag in fetched:
+                self._add(tag['id'], tag['name'], tag.get('slug'))
+            self.synced_at = time.time()
+        self._save()
+        print(f"🏷️ Índice de tags sincronizado ({'completo' if full else 'incremental'}): {len(fetched)} tags lidas")
+        return True
+
+    def _staleness(self) -> Optional[str]:
+        now = time.time()
+        if now - self.full_synced_at > WP_TAG_FULL_SYNC_SECONDS:
+            return 'full'
+        if now - self.synced_at > WP_TAG_REFRESH_SECONDS:
+            return 'incremental'
+        return None
+
+    def refresh_if_stale(self, headers: Dict[str, str]):
+        if self._staleness() is None:
+            return
+        with self.sync_lock:
+            # Outra thread pode ter sincronizado enquanto esta esperava o lock
+            staleness = self._staleness()
+            if staleness is not None:
+                self.sync(headers, full=staleness == 'full')
+
+    def resolve(self, names: List[str], headers: Dict[str, str]) -> List[int]:
+        """IDs das tags na ordem dos nomes; as que não existem são criadas em paralelo"""
+        self.refresh_if_stale(headers)
+
+        ids: Dict[str, Optional[int]] = {}
+        for name in names:
+            with self.lock:
+                self.lookups += 1
+            ids[name] = self.lookup(name)
+
+        missing = [name for name, tag_id in ids.items() if tag_id is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(WP_TAG_CREATE_WORKERS, len(missing))) as executor:
+                for name, tag_id in zip(missing, executor.map(lambda name: self.get_or_create(name, headers), missing)):
+                    ids[name] = tag_id
+            self._save()
+
+        return [tag_id for tag_id in dict.fromkeys(ids.values()) if tag_id]
+
+    def get_or_create(self, name: str, headers: Dict[str, str]) -> Optional[int]:
+        """Cria a tag; se outra thread já está criando o mesmo nome, espera pelo resultado dela"""
+        key = wp_slug(name)
+        with self.lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            tag_id = self.lookup(name) or self._create(name, headers)
+            future.set_result(tag_id)
+            return tag_id
+        except Exception as e:
+            print(f"❌ Erro ao criar tag '{name}': {e}")
+            future.set_result(None)
+            return None
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def _create(self, name: str, headers: Dict[str, str]) -> Optional[int]:
+        response = http_client.post(
+            f"{self.wp_url}/wp-json/wp/v2/tags",
+            json={'name': name, 'slug': wp_slug(name)},
+            headers=headers,
+            timeout=15
+        )
+        with self.lock:
+            self.network_calls += 1
+
+        if response.status_code in [200, 201]:
+            new_tag = response.json()
+            with self.lock:
+                self._add(new_tag['id'], new_tag.get('name', name), new_tag.get('slug'))
+                self.created += 1
+            print(f"✅ Nova tag criada: {name} (ID: {new_tag['id']})")
+            return new_tag['id']
+
+        # Tag criada por outro processo desde a última sincronização: o WordPress informa o ID
+        try:
+            error = response.json()
+        except ValueError:
+            error = {}
+        if error.get('code') == 'term_exists':
+            tag_id = (error.get('data') or {}).get('term_id') or error.get('additional_data', [None])[0]
+            if tag_id:
+                with self.lock:
+                    self._add(int(tag_id), name)
+                return int(tag_id)
+
+        print(f"❌ Erro ao criar tag '{name}': {response.status_code}")
+        return None
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'tags': len(self.by_name),
+                'lookups': self.lookups,
+                'network_calls': self.network_calls,
+                'created': self.created,
+                'synced_at': datetime.fromtimestamp(self.synced_at, timezone.utc).isoformat() if self.synced_at else None
+            }
+
+WP_CATEGORY_TTL = float(os.getenv('WP_CATEGORY_TTL', '3600'))
+# Após uma carga com falha, espera este tempo antes de tentar de novo (cache negativo)
+WP_CATEGORY_RETRY_SECONDS = float(os.getenv('WP_CATEGORY_RETRY_SECONDS', '60'))
+
+class WordPressCategoryIndex:
+    """Árvore de categorias do WordPress carregada uma vez e indexada por nome, slug e caminho
+    ("Cidades > Ilhabela"); atualizada em segundo plano quando passa do TTL"""
+
+    def __init__(self, wp_url: str, path: str = os.path.join(DATA_DIR, 'wp_categories.json')):
+        self.wp_url = wp_url
+        self.path = path
+        self.lock = threading.Lock()
+        self.categories: Dict[int, Dict] = {}
+        self.by_name: Dict[str, int] = {}
+        self.by_slug: Dict[str, int] = {}
+        self.by_path: Dict[str, int] = {}
+        self.loaded_at = 0.0
+        self.failed_at = 0.0
+        self.refreshing = False
+        self.sync_lock = threading.Lock()  # Uma carga por vez, mesmo com vários posts em paralelo
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('wp_url') == self.wp_url:
+                self._index(data.get('categories', []))
+                self.loaded_at = data.get('loaded_at', 0.0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Cache de categorias ignorado ({e})")
+
+    def _index(self, categories: List[Dict]):
+        """Monta os índices em estruturas novas e troca de uma vez (leitores nunca veem meio índice)"""
+        by_id = {category['id']: category for category in categories}
+        by_name, by_slug, by_path = {}, {}, {}
+
+        def path_of(category: Dict) -> str:
+            names, seen = [], set()
+            while category and category['id'] not in seen:
+                seen.add(category['id'])
+                names.append(normalize_text(html.unescape(category['name'])))
+                category = by_id.get(category.get('parent') or 0)
+            return ' > '.join(reversed(names))
+
+        for category in categories:
+            # Nomes repetidos em ramos diferentes: o primeiro de nível mais alto vence no índice por nome
+            by_name.setdefault(normalize_text(html.unescape(category['name'])), category['id'])
+            by_slug[category['slug']] = category['id']
+            by_path[path_of(category)] = category['id']
+
+        with self.lock:
+            self.categories, self.by_name, self.by_slug, self.by_path = by_id, by_name, by_slug, by_path
+
+    def sync(self, headers: Dict[str, str]) -> bool:
+        """Carrega todas as categorias (paginado, per_page=100)"""
+        url = f"{self.wp_url}/wp-json/wp/v2/categories"
+        categories = []
+        page = 1
+        try:
+            while True:
+                response = http_client.get(url, params={'per_page': 100, 'page': page, '_fields': 'id,name,slug,parent'},
+                                           headers=headers, timeout=15)
+                if response.status_code != 200:
+                    print(f"⚠️ Erro ao carregar categorias do WordPress: {response.status_code}")
+                    self.failed_at = time.time()
+                    return False
+                batch = response.json()
+                categories.extend(batch)
+                if not batch or page >= int(response.headers.get('X-WP-TotalPages', '1') or 1):
+                    break
+                page += 1
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar categorias do WordPress: {e}")
+            self.failed_at = time.time()
+            return False
+
+        self._index(categories)
+        self.loaded_at = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'wp_url': self.wp_url, 'loaded_at': self.loaded_at, 'categories': categories}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Erro ao salvar cache de categorias: {e}")
+        print(f"📂 Categorias do WordPress carregadas: {len(categories)}")
+        return True
+
+    def ensure_fresh(self, headers: Dict[str, str]):
+        """Primeira carga é síncrona; depois, se passou do TTL, atualiza em segundo plano.
+        Logo após uma falha não tenta de novo: os posts seguem sem categoria até o retry."""
+        if time.time() - self.failed_at < WP_CATEGORY_RETRY_SECONDS:
+            return
+        if not self.categories:
+            with self.sync_lock:
+                # Outra thread pode ter carregado (ou falhado) enquanto esta esperava o lock
+                if not self.categories and time.time() - self.failed_at >= WP_CATEGORY_RETRY_SECONDS:
+                    self.sync(headers)
+        elif time.time() - self.loaded_at > WP_CATEGORY_TTL:
+            with self.lock:
+                if self.refreshing:
+                    return
+                self.refreshing = True
+            threading.Thread(target=self._background_sync, args=(headers,), daemon=True).start()
+
+    def _background_sync(self, headers: Dict[str, str]):
+        try:
+            with self.sync_lock:
+                if time.time() - self.loaded_at > WP_CATEGORY_TTL:
+                    self.sync(headers)
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def find(self, name: str, parent: str = '') -> Optional[int]:
+        """ID pelo caminho completo, depois pelo nome e pelo slug"""
+        if not name:
+            return None
+        key = normalize_text(name)
+        with self.lock:
+            if parent:
+                category_id = self.by_path.get(f"{normalize_text(parent)} > {key}")
+                if category_id:
+                    return category_id
+            return self.by_path.get(key) or self.by_name.get(key) or self.by_slug.get(wp_slug(name))
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'categories': len(self.categories),
+                'loaded_at': datetime.fromtimestamp(self.loaded_at, timezone.utc).isoformat() if self.loaded_at else None,
+                'ttl': WP_CATEGORY_TTL,
+                'failed_at': datetime.fromtimestamp(self.failed_at, timezone.utc).isoformat() if self.failed_at else None
+            }
+
+# Distância máxima (bits) entre dHashes para considerar a mesma foto (recompressão, outro tamanho)
+MEDIA_DHASH_MAX_DISTANCE = int(os.getenv('MEDIA_DHASH_MAX_DISTANCE', '4'))
+# Intervalo entre confirmações de que um anexo do índice ainda existe no WordPress
+MEDIA_VERIFY_SECONDS = float(os.getenv('MEDIA_VERIFY_SECONDS', '3600'))
+
+def image_dhash(data: bytes) -> Optional[int]:
+    """Hash perceptual (dHash de 64 bits) da imagem; None se o Pillow não conseguir abri-la"""
+    try:
+        from PIL import Image
+        with Image.open(BytesIO(data)) as img:
+            return dhash_image(img)
+    except Exception:
+        return None
+
+def dhash_image(img) -> int:
+    """dHash de uma imagem PIL já aberta"""
+    pixels = list(img.convert('L').resize((9, 8)).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+# Pipeline da imagem destacada: tamanho do tema, formato de saída e limite de download
+FEATURED_IMAGE_SIZE = tuple(int(value) for value in os.getenv('FEATURED_IMAGE_SIZE', '1200x675').lower().split('x'))
+FEATURED_IMAGE_FORMAT = os.getenv('FEATURED_IMAGE_FORMAT', 'jpeg').lower()  # 'jpeg' (progressivo) ou 'webp'
+FEATURED_IMAGE_QUALITY = int(os.getenv('FEATURED_IMAGE_QUALITY', '82'))
+IMAGE_MAX_DOWNLOAD_BYTES = int(os.getenv('IMAGE_MAX_DOWNLOAD_MB', '15')) * 1024 * 1024
+IMAGE_CACHE_DIR = os.path.join(DATA_DIR, 'image_cache')
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime: str
+    extension: str
+    width: int
+    height: int
+    source_format: str
+    dhash: Optional[int] = None
+
+def prepare_featured_image(data: bytes, content_sha256: str) -> PreparedImage:
+    """Detecta o formato real, recorta/redimensiona para o tamanho do tema (sem ampliar) e
+    recodifica em JPEG progressivo ou WebP. O derivado fica em cache no disco pelo hash do original."""
+    from PIL import Image, ImageOps
+
+    output_format = 'WEBP' if FEATURED_IMAGE_FORMAT == 'webp' else 'JPEG'
+    extension = 'webp' if output_format == 'WEBP' else 'jpg'
+    target_width, target_height = FEATURED_IMAGE_SIZE
+    cache_key = f"{content_sha256}_{target_width}x{target_height}_q{FEATURED_IMAGE_QUALITY}.{extension}"
+    cache_path = os.path.join(IMAGE_CACHE_DIR, cache_key)
+
+    try:
+        with open(f"{cache_path}.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(cache_path, 'rb') as f:
+            return PreparedImage(data=f.read(), **meta)
+    except (FileNotFoundError, ValueError, TypeError):
+        pass
+
+    with Image.open(BytesIO(data)) as img:
+        source_format = img.format or 'desconhecido'
+        img = ImageOps.exif_transpose(img)
+        dhash = dhash_image(img)
+
+        # Transparência vira fundo branco (JPEG não tem canal alfa)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # Mantém a proporção do tema; imagens menores que o alvo não são ampliadas
+        scale = min(1.0, img.width / target_width, img.height / target_height)
+        size = (max(1, round(target_width * scale)), max(1, round(target_height * scale)))
+        img = ImageOps.fit(img, size, method=Image.LANCZOS)
+
+        buffer = BytesIO()
+        if output_format == 'WEBP':
+            img.save(buffer, 'WEBP', quality=FEATURED_IMAGE_QUALITY, method=4)
+        else:
+            img.save(buffer, 'JPEG', quality=FEATURED_IMAGE_QUALITY, optimize=True, progressive=True)
+
+    prepared = PreparedImage(data=buffer.getvalue(), mime=f"image/{output_format.lower()}", extension=extension,
+                             width=size[0], height=size[1], source_format=source_format, dhash=dhash)
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            f.write(prepared.data)
+        meta = {key: value for key, value in prepared.__dict__.items() if key != 'data'}
+        with open(f"{cache_path}.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    except Exception as e:
+        print(f"⚠️ Erro ao salvar imagem processada em cache: {e}")
+    return prepared
+
+class MediaIndex:
+    """Imagens já enviadas à biblioteca de mídia: URL de origem, sha256 do conteúdo e dHash -> ID do anexo.
+    Imagem repetida não é baixada (mesma URL) nem enviada de novo (mesmo conteúdo)."""
+
+    def __init__(self, wp_url: str, path: str = os.path.join(DATA_DIR, 'wp_media.json')):
+        self.wp_url = wp_url
+        self.path = path
+        self.lock = threading.Lock()
+        self.by_url: Dict[str, int] = {}
+        self.by_sha256: Dict[str, int] = {}
+        self.by_dhash: Dict[int, int] = {}
+        self.checked_at: Dict[int, float] = {}  # ID -> última confirmação no WordPress (só em memória)
+        self.url_hits = 0
+        self.hash_hits = 0
+        self.uploads = 0
+        self.invalidated = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('wp_url') == self.wp_url:
+                self.by_url = data.get('by_url', {})
+                self.by_sha256 = data.get('by_sha256', {})
+                self.by_dhash = {int(dhash): media_id for dhash, media_id in data.get('by_dhash', {}).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Índice de mídia ignorado ({e})")
+
+    def _save(self):
+        """Grava o índice (chamado com o lock)"""
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'wp_url': self.wp_url,
+                    'by_url': self.by_url,
+                    'by_sha256': self.by_sha256,
+                    'by_dhash': {str(dhash): media_id for dhash, media_id in self.by_dhash.items()}
+                }, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Erro ao salvar índice de mídia: {e}")
+
+    def find_by_url(self, url: str) -> Optional[int]:
+        with self.lock:
+            media_id = self.by_url.get(url)
+            if media_id:
+                self.url_hits += 1
+            return media_id
+
+    def find_by_content(self, sha256: str, dhash: Optional[int] = None) -> Optional[int]:
+        with self.lock:
+            media_id = self.by_sha256.get(sha256)
+            if not media_id and dhash is not None:
+                for known_dhash, known_id in self.by_dhash.items():
+                    if bin(known_dhash ^ dhash).count('1') <= MEDIA_DHASH_MAX_DISTANCE:
+                        media_id = known_id
+                        break
+            if media_id:
+                self.hash_hits += 1
+            return media_id
+
+    def remember(self, media_id: int, url: str, sha256: Optional[str] = None, dhash: Optional[int] = None,
+                 uploaded: bool = False):
+        with self.lock:
+            self.by_url[url] = media_id
+            if sha256:
+                self.by_sha256[sha256] = media_id
+            if dhash is not None:
+                self.by_dhash[dhash] = media_id
+            if uploaded:
+                self.uploads += 1
+                self.checked_at[media_id] = time.time()
+            self._save()
+
+    def needs_check(self, media_id: int) -> bool:
+        with self.lock:
+            return time.time() - self.checked_at.get(media_id, 0.0) > MEDIA_VERIFY_SECONDS
+
+    def mark_checked(self, media_id: int):
+        with self.lock:
+            self.checked_at[media_id] = time.time()
+
+    def forget(self, media_id: int):
+        """Remove todas as entradas que apontam para um anexo que não existe mais"""
+        with self.lock:
+            self.by_url = {url: known for url, known in self.by_url.items() if known != media_id}
+            self.by_sha256 = {sha256: known for sha256, known in self.by_sha256.items() if known != media_id}
+            self.by_dhash = {dhash: known for dhash, known in self.by_dhash.items() if known != media_id}
+            self.checked_at.pop(media_id, None)
+            self.invalidated += 1
+            self._save()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'attachments': len(set(self.by_url.values()) | set(self.by_sha256.values())),
+                'urls': len(self.by_url),
+                'url_hits': self.url_hits,
+                'hash_hits': self.hash_hits,
+                'uploads': self.uploads,
+                'invalidated': self.invalidated
+            }
+
+# Limite de requisições por chamada do endpoint /wp-json/batch/v1 no WordPress
+WP_BATCH_SIZE = 25
+WP_PREPARE_WORKERS = int(os.getenv('WP_PREPARE_WORKERS', '4'))
+
 class WordPressPublisher:
     def __init__(self):
         self.wp_url = os.getenv('WP_URL', 'https://jornalvozdolitoral.com')
         self.wp_username = os.getenv('WP_USERNAME', 'automacao')
         self.wp_password = os.getenv('WP_PASSWORD', 'VBGZv5eCueyg1gkvmBfRCSsb')
+        self.tag_index = WordPressTagIndex(self.wp_url)
+        self.category_index = WordPressCategoryIndex(self.wp_url)
+        self.media_index = MediaIndex(self.wp_url)
+
+    def is_configured(self) -> bool:
+        """Credenciais WordPress configuradas (senão publica em modo demonstração)"""
+        return (self.wp_url != 'https://seu-site.com' and 
+                'jornalvozdolitoral.com' in self.wp_url and
+                self.wp_username == 'automacao' and 
+                len(self.wp_password) > 10)
+
+    def _auth_headers(self) -> Dict[str, str]:
+        """Autenticação básica"""
+        credentials = f"{self.wp_username}:{self.wp_password}"
+        token = base64.b64encode(credentials.encode()).decode()
+        return {
+            'Authorization': f'Basic {token}',
+            'Content-Type': 'application/json'
+        }
 
     def publish_post(self, content: Dict[str, str]) -> bool:
         """Publica conteúdo no WordPress"""
@@ -888,64 +3145,24 @@ class WordPressPublisher:
             clean_title = content.get('clean_title', content['title'].replace(' | Portal Litoral Norte', ''))
             
             # Se as credenciais WordPress estão configuradas, tenta publicar
-            if (self.wp_url != 'https://seu-site.com' and 
-                'jornalvozdolitoral.com' in self.wp_url and
-                self.wp_username == 'automacao' and 
-                len(self.wp_password) > 10):
-                
-                import requests
-                import base64
-                
-                # Autenticação básica
-                credentials = f"{self.wp_username}:{self.wp_password}"
-                token = base64.b64encode(credentials.encode()).decode()
-                
-                headers = {
-                    'Authorization': f'Basic {token}',
-                    'Content-Type': 'application/json'
-                }
-                
-                # 1. Primeiro, faz upload da imagem destacada
-                featured_image_id = self.upload_featured_image(content.get('image_url', ''), headers)
+            if self.is_configured():
                 
-                # 2. Cria/obtém tags
-                tag_ids = self.create_wp_tags(content, headers)
+                headers = self._auth_headers()
                 
-                # 3. Dados do post para WordPress
-                post_data = {
-                    'title': clean_title,
-                    'content': content.get('wordpress_content', content['content']),
-                    'status': 'publish',
-                    'excerpt': content['meta_description'],
-                    'categories': self.get_wp_category_ids(content.get('wp_category', {})),
-                    'featured_media': featured_image_id,
-                    'tags': tag_ids,
-                    'meta': {
-                        '_yoast_wpseo_metadesc': content['meta_description'],
-                        '_wp_attachment_image_alt': content.get('image_alt', content['meta_description'])
-                    }
-                }
+                # 1-3. Imagem destacada, tags e dados do post (meta já vai junto na criação)
+                post_data = self.build_post_data(content, headers)
                 
                 # API REST do WordPress para posts
-                api_url = f"{self.wp_url}/wp-json/wp/v2/posts"
-                
-                response = requests.post(api_url, json=post_data, headers=headers, timeout=30)
+                result = self._create_post(post_data, headers)
                 
-                if response.status_code in [200, 201]:
-                    post_response = response.json()
+                if result['success']:
                     print(f"✅ Post publicado no WordPress: {clean_title}")
-                    print(f"🔗 URL: {post_response.get('link', 'URL não disponível')}")
-                    print(f"📸 Imagem destacada ID: {featured_image_id}")
-                    print(f"🏷️ Tags criadas: {len(tag_ids)} tags")
-                    
-                    # Atualiza meta fields se necessário
-                    if featured_image_id > 0:
-                        self.update_post_meta(post_response['id'], content, headers)
-                    
+                    print(f"🔗 URL: {result['link'] or 'URL não disponível'}")
+                    print(f"📸 Imagem destacada ID: {post_data['featured_media']}")
+                    print(f"🏷️ Tags criadas: {len(post_data['tags'])} tags")
                     return True
                 else:
-                    print(f"❌ Erro na publicação WordPress: {response.status_code}")
-                    print(f"Resposta: {response.text[:200]}")
+                    print(f"❌ Erro na publicação WordPress: {result['error']}")
                     return False
             else:
                 # Modo demonstração - mostra como seria publicado
@@ -966,9 +3183,136 @@ class WordPressPublisher:
             print(f"❌ Erro ao publicar no WordPress: {e}")
             return False
 
+    def build_post_data(self, content: Dict[str, str], headers: Dict[str, str]) -> Dict:
+        """Dados do post para /wp/v2/posts, com imagem destacada, tags e categorias resolvidas"""
+        clean_title = content.get('clean_title', content['title'].replace(' | Portal Litoral Norte', ''))
+        
+        # 1. Primeiro, faz upload da imagem destacada
+        featured_image_id = self.upload_featured_image(content.get('image_url', ''), headers)
+        
+        # 2. Cria/obtém tags
+        tag_ids = self.create_wp_tags(content, headers)
+        
+        # 3. Dados do post para WordPress (os meta dados vão na própria criação, sem update separado)
+        return {
+            'title': clean_title,
+            'content': content.get('wordpress_content', content['content']),
+            'status': 'publish',
+            'excerpt': content['meta_description'],
+            'categories': self.get_wp_category_ids(content.get('wp_category', {})),
+            'featured_media': featured_image_id,
+            'tags': tag_ids,
+            'meta': {
+                '_yoast_wpseo_metadesc': content['meta_description'],
+                '_wp_attachment_image_alt': content.get('image_alt', content['meta_description'])
+            }
+        }
+
+    def _create_post(self, post_data: Dict, headers: Dict[str, str]) -> Dict:
+        """Cria um post pelo endpoint individual; retorna success, id, link e error"""
+        response = http_client.post(f"{self.wp_url}/wp-json/wp/v2/posts", json=post_data, headers=headers, timeout=30)
+        if response.status_code in [200, 201]:
+            post_response = response.json()
+            return {'success': True, 'id': post_response.get('id'), 'link': post_response.get('link'), 'error': None}
+        return {'success': False, 'id': None, 'link': None,
+                'error': f"{response.status_code}: {response.text[:200]}"}
+
+    def publish_posts(self, contents: List[Dict]) -> List[Dict]:
+        """Publica vários posts agrupando as criações em /wp-json/batch/v1 (até WP_BATCH_SIZE por
+        requisição). Retorna, na mesma ordem, success, id, link e error de cada post."""
+        if not contents:
+            return []
+        
+        if not self.is_configured():
+            # Modo demonstração: mesmo fluxo do post individual
+            return [{'success': self.publish_post(content), 'id': None, 'link': None, 'error': None}
+                    for content in contents]
+        
+        headers = self._auth_headers()
+        
+        # Imagem, tags e categorias de cada post (em geral resolvidas pelos índices locais)
+        def prepare(content: Dict) -> Optional[Dict]:
+            try:
+                return self.build_post_data(content, headers)
+            except Exception as e:
+                print(f"❌ Erro ao preparar post '{content.get('clean_title', content.get('title', ''))}': {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=min(WP_PREPARE_WORKERS, len(contents))) as executor:
+            posts = list(executor.map(prepare, contents))
+        
+        results: List[Optional[Dict]] = [None] * len(posts)
+        ready = [(index, post) for index, post in enumerate(posts) if post is not None]
+        for index, post in enumerate(posts):
+            if post is None:
+                results[index] = {'success': False, 'id': None, 'link': None, 'error': 'falha ao preparar o post'}
+        
+        for start in range(0, len(ready), WP_BATCH_SIZE):
+            chunk = ready[start:start + WP_BATCH_SIZE]
+            chunk_results = self._publish_batch([post for _, post in chunk], headers)
+            if chunk_results is None:
+                # WordPress < 5.6 (sem batch/v1): cai para uma requisição por post
+                print("⚠️ Endpoint batch/v1 indisponível, publicando post a post")
+                chunk_results = [self._create_post(post, headers) for _, post in chunk]
+            for (index, _), result in zip(chunk, chunk_results):
+                results[index] = result
+        
+        published = sum(1 for result in results if result['success'])
+        print(f"✅ {published}/{len(results)} posts publicados no WordPress "
+              f"({math.ceil(len(ready) / WP_BATCH_SIZE)} requisição(ões) batch)")
+        for result, post in zip(results, posts):
+            if not result['success']:
+                print(f"❌ Falha em '{post['title'] if post else '?'}': {result['error']}")
+        return results
+
+    def _publish_batch(self, posts: List[Dict], headers: Dict[str, str]) -> Optional[List[Dict]]:
+        """Uma requisição batch/v1 com até 25 criações; None se o endpoint não existir"""
+        payload = {
+            'validation': 'normal',  # cada post é validado e criado independentemente
+            'requests': [{'method': 'POST', 'path': '/wp/v2/posts', 'body': post} for post in posts]
+        }
+        try:
+            response = http_client.post(f"{self.wp_url}/wp-json/batch/v1", json=payload, headers=headers, timeout=60)
+        except Exception as e:
+            return [{'success': False, 'id': None, 'link': None, 'error': str(e)} for _ in posts]
+        
+        if response.status_code in (404, 405):
+            return None
+        if response.status_code not in (200, 207):
+            error = f"batch retornou {response.status_code}: {response.text[:200]}"
+            return [{'success': False, 'id': None, 'link': None, 'error': error} for _ in posts]
+        
+        responses = response.json().get('responses', [])
+        results = []
+        for position in range(len(posts)):
+            item = responses[position] if position < len(responses) else {}
+            body = item.get('body') or {}
+            if item.get('status') in (200, 201):
+                results.append({'success': True, 'id': body.get('id'), 'link': body.get('link'), 'error': None})
+            else:
+                error = body.get('message') or f"status {item.get('status', 'ausente')}"
+                results.append({'success': False, 'id': None, 'link': None, 'error': error})
+        return results
+
     def get_wp_category_ids(self, wp_category: Dict[str, str]) -> List[int]:
-        """Retorna IDs das categorias WordPress (implementar conforme sua instalação)"""
-        # Mapeamento básico - ajuste conforme suas categorias WordPress
+        """Retorna IDs das categorias WordPress a partir da taxonomia real do site"""
+        main_cat = wp_category.get('main_category', 'Destaque')
+        sub_cat = wp_category.get('subcategory', '')
+        
+        if self.is_configured():
+            self.category_index.ensure_fresh(self._auth_headers())
+        
+        # Busca em memória: "Cidades > Ilhabela" pelo caminho, senão pelo nome/slug
+        ids = [category_id for category_id in (self.category_index.find(main_cat),
+                                               self.category_index.find(sub_cat, parent=main_cat)) if category_id]
+        if ids:
+            return list(dict.fromkeys(ids))
+        
+        destaque_id = self.category_index.find('Destaque')
+        if destaque_id:
+            return [destaque_id]
+        
+        # Taxonomia indisponível: mapeamento básico - ajuste conforme suas categorias WordPress
         category_mapping = {
             "Cidades": 1,
             "Brasil": 2, 
@@ -981,8 +3325,6 @@ class WordPressPublisher:
         }
         
         ids = []
-        main_cat = wp_category.get('main_category', 'Destaque')
-        sub_cat = wp_category.get('subcategory', '')
         
         if main_cat in category_mapping:
             ids.append(category_mapping[main_cat])
@@ -994,74 +3336,27 @@ class WordPressPublisher:
 
     def create_wp_tags(self, content: Dict[str, str], headers: Dict[str, str]) -> List[int]:
         """Cria tags no WordPress e retorna os IDs"""
-        tag_ids = []
         
         try:
-            import requests
             
-            # Extrai tags do conteúdo
+            # Extrai tags do conteúdo (lista pura quando o conteúdo foi gerado por ArticleAnalysis)
+            tag_names = content.get('tag_names')
             tags_text = content.get('tags', '')
-            if not tags_text:
+            if not tag_names and not tags_text:
                 return []
             
-            # Remove HTML das tags e extrai texto limpo
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(tags_text, 'html.parser')
-            tag_names = [tag.get_text().strip() for tag in soup.find_all('span')]
+            if not tag_names:
+                # Remove HTML das tags e extrai texto limpo
+                soup = BeautifulSoup(tags_text, 'html.parser')
+                tag_names = [tag.get_text().strip() for tag in soup.find_all('span')]
             
             if not tag_names:
                 # Fallback: extrai do texto direto
                 import re
                 tag_names = re.findall(r'>(.*?)<', tags_text)
             
-            for tag_name in tag_names:
-                if not tag_name or len(tag_name) < 2:
-                    continue
-                    
-                # Verifica se tag já existe
-                search_url = f"{self.wp_url}/wp-json/wp/v2/tags"
-                search_params = {'search': tag_name}
-                
-                search_response = requests.get(
-                    search_url, 
-                    params=search_params,
-                    headers=headers,
-                    timeout=15
-                )
-                
-                if search_response.status_code == 200:
-                    existing_tags = search_response.json()
-                    
-                    # Verifica se existe tag com nome exato
-                    existing_tag = None
-                    for tag in existing_tags:
-                        if tag['name'].lower() == tag_name.lower():
-                            existing_tag = tag
-                            break
-                    
-                    if existing_tag:
-                        tag_ids.append(existing_tag['id'])
-                        print(f"🏷️ Tag existente encontrada: {tag_name} (ID: {existing_tag['id']})")
-                    else:
-                        # Cria nova tag
-                        create_data = {
-                            'name': tag_name,
-                            'slug': tag_name.lower().replace(' ', '-').replace('ã', 'a').replace('ç', 'c')
-                        }
-                        
-                        create_response = requests.post(
-                            search_url,
-                            json=create_data,
-                            headers=headers,
-                            timeout=15
-                        )
-                        
-                        if create_response.status_code in [200, 201]:
-                            new_tag = create_response.json()
-                            tag_ids.append(new_tag['id'])
-                            print(f"✅ Nova tag criada: {tag_name} (ID: {new_tag['id']})")
-                        else:
-                            print(f"❌ Erro ao criar tag '{tag_name}': {create_response.status_code}")
+            # Resolve pelo índice local; só tags novas geram chamadas (criadas em paralelo)
+            tag_ids = self.tag_index.resolve([name for name in tag_names if name and len(name) >= 2], headers)
             
             print(f"🏷️ Total de tags processadas: {len(tag_ids)}")
             return tag_ids
@@ -1070,54 +3365,85 @@ class WordPressPublisher:
             print(f"❌ Erro ao processar tags: {e}")
             return []
 
-    def update_post_meta(self, post_id: int, content: Dict[str, str], headers: Dict[str, str]):
-        """Atualiza metadados do post"""
+    def _media_exists(self, media_id: int, headers: Dict[str, str]) -> bool:
+        """Confirma que o anexo do índice ainda existe (no máximo uma consulta por MEDIA_VERIFY_SECONDS).
+        Em 404/410 o ID sai do índice; erros de rede mantêm o ID."""
+        if not self.media_index.needs_check(media_id):
+            return True
         try:
-            import requests
-            
-            # Atualiza alt text da imagem destacada se disponível
-            if content.get('image_alt'):
-                meta_url = f"{self.wp_url}/wp-json/wp/v2/posts/{post_id}"
-                meta_data = {
-                    'meta': {
-                        '_wp_attachment_image_alt': content['image_alt']
-                    }
-                }
-                
-                requests.post(meta_url, json=meta_data, headers=headers, timeout=15)
-                print("✅ Meta dados atualizados")
-                
+            response = http_client.get(f"{self.wp_url}/wp-json/wp/v2/media/{media_id}",
+                                       params={'_fields': 'id'}, headers=headers, timeout=15)
         except Exception as e:
-            print(f"⚠️ Erro ao atualizar meta dados: {e}")
+            print(f"⚠️ Não foi possível confirmar a mídia {media_id}: {e}")
+            return True
+        if response.status_code in (404, 410):
+            print(f"🗑️ Mídia {media_id} não existe mais no WordPress, removida do índice")
+            self.media_index.forget(media_id)
+            return False
+        if response.status_code == 200:
+            self.media_index.mark_checked(media_id)
+        return True
 
     def upload_featured_image(self, image_url: str, headers: Dict[str, str]) -> int:
         """Upload da imagem destacada para WordPress"""
         if not image_url:
             return 0
+        
+        # Mesma URL já enviada: nem baixa
+        media_id = self.media_index.find_by_url(image_url)
+        if media_id and self._media_exists(media_id, headers):
+            print(f"♻️ Imagem destacada reaproveitada da biblioteca - ID: {media_id}")
+            return media_id
             
         try:
-            import requests
-            from io import BytesIO
-            
-            # Download da imagem
-            img_response = requests.get(image_url, timeout=30)
-            if img_response.status_code != 200:
-                print(f"❌ Erro ao baixar imagem: {img_response.status_code}")
+            # Download em blocos, com limite de tamanho
+            try:
+                image_data, _ = http_client.download(image_url, IMAGE_MAX_DOWNLOAD_BYTES, timeout=30)
+            except ValueError as e:
+                print(f"❌ Erro ao baixar imagem: {e}")
                 return 0
             
-            # Determina o nome do arquivo
-            import os
-            from urllib.parse import urlparse
+            # Mesmo conteúdo vindo de outra URL: não envia de novo
+            content_sha256 = hashlib.sha256(image_data).hexdigest()
+            media_id = self.media_index.find_by_content(content_sha256)
+            
+            # Redimensiona e recodifica (derivado em cache); o dHash pega a mesma foto em outra resolução
+            prepared = None
+            if not media_id:
+                try:
+                    prepared = prepare_featured_image(image_data, content_sha256)
+                except Exception as e:
+                    print(f"❌ Imagem inválida ou formato não suportado: {e}")
+                    return 0
+                media_id = self.media_index.find_by_content(content_sha256, prepared.dhash)
+            
+            if media_id and not self._media_exists(media_id, headers):
+                # Anexo apagado no WordPress: o índice já o esqueceu, envia de novo
+                media_id = 0
+                if prepared is None:
+                    try:
+                        prepared = prepare_featured_image(image_data, content_sha256)
+                    except Exception as e:
+                        print(f"❌ Imagem inválida ou formato não suportado: {e}")
+                        return 0
+            
+            if media_id:
+                self.media_index.remember(media_id, image_url, content_sha256, prepared.dhash if prepared else None)
+                print(f"♻️ Imagem destacada reaproveitada da biblioteca - ID: {media_id}")
+                return media_id
+            
+            content_dhash = prepared.dhash
+            print(f"🖼️ Imagem {prepared.source_format} otimizada: {len(image_data) // 1024} KB -> "
+                  f"{len(prepared.data) // 1024} KB ({prepared.width}x{prepared.height} {prepared.extension})")
+            
+            # Determina o nome do arquivo (com a extensão do formato gerado)
             parsed_url = urlparse(image_url)
             filename = os.path.basename(parsed_url.path) or f"featured_image_{int(time.time())}"
-            
-            # Se não tem extensão, adiciona .jpg
-            if '.' not in filename:
-                filename += '.jpg'
+            filename = f"{os.path.splitext(filename)[0]}.{prepared.extension}"
             
             # Prepara dados para upload
             files = {
-                'file': (filename, BytesIO(img_response.content), 'image/jpeg')
+                'file': (filename, BytesIO(prepared.data), prepared.mime)
             }
             
             # Headers para multipart/form-data
@@ -1128,7 +3454,7 @@ class WordPressPublisher:
             # Upload via WordPress REST API
             upload_url = f"{self.wp_url}/wp-json/wp/v2/media"
             
-            upload_response = requests.post(
+            upload_response = http_client.post(
                 upload_url, 
                 files=files, 
                 headers=upload_headers,
@@ -1138,6 +3464,8 @@ class WordPressPublisher:
             if upload_response.status_code in [200, 201]:
                 media_data = upload_response.json()
                 media_id = media_data.get('id', 0)
+                if media_id:
+                    self.media_index.remember(media_id, image_url, content_sha256, content_dhash, uploaded=True)
                 print(f"✅ Imagem destacada uploaded - ID: {media_id}")
                 return media_id
             else:
@@ -1149,6 +3477,570 @@ class WordPressPublisher:
             print(f"❌ Erro ao fazer upload da imagem: {e}")
             return 0
 
+# Fontes tentadas por família, na ordem; sem nenhuma instalada usa a fonte padrão do Pillow
+FONT_CANDIDATES = {
+    'sans': ["arial.ttf", "helvetica.ttf", "DejaVuSans.ttf"],
+    'sans-bold': ["arialbd.ttf", "Arial Bold.ttf", "DejaVuSans-Bold.ttf"]
+}
+
+@lru_cache(maxsize=64)
+def load_font(family: str, size: int):
+    """Fonte carregada uma vez por (família, tamanho) no processo"""
+    from PIL import ImageFont
+    for font_name in FONT_CANDIDATES.get(family, [family]):
+        try:
+            return ImageFont.truetype(font_name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)  # Pillow >= 10.1: fonte padrão escalável
+    except TypeError:
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=8192)
+def glyph_advance(family: str, size: int, char: str) -> float:
+    """Avanço horizontal (px) de um caractere, medido uma vez por fonte"""
+    return load_font(family, size).getlength(char)
+
+def text_width(text: str, family: str, size: int) -> float:
+    """Largura do texto em pixels pela soma dos avanços em cache (sem kerning)"""
+    return sum(glyph_advance(family, size, char) for char in text)
+
+def wrap_text_pixels(text: str, family: str, size: int, max_width: float, max_lines: int) -> List[str]:
+    """Quebra o texto por largura em pixels; corta com reticências além de max_lines"""
+    space = glyph_advance(family, size, ' ')
+    lines: List[str] = []
+    current, current_width = '', 0.0
+
+    for word in text.split():
+        word_width = text_width(word, family, size)
+        # Palavra maior que a linha inteira é quebrada por caracteres
+        while word_width > max_width:
+            if current:
+                lines.append(current)
+                current, current_width = '', 0.0
+            cut, cut_width = '', 0.0
+            for char in word:
+                advance = glyph_advance(family, size, char)
+                if cut and cut_width + advance > max_width:
+                    break
+                cut, cut_width = cut + char, cut_width + advance
+            lines.append(cut)
+            word = word[len(cut):]
+            word_width -= cut_width
+        if not word:
+            continue
+        if current and current_width + space + word_width <= max_width:
+            current, current_width = f"{current} {word}", current_width + space + word_width
+        elif current:
+            lines.append(current)
+            current, current_width = word, word_width
+        else:
+            current, current_width = word, word_width
+    if current:
+        lines.append(current)
+
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        last = lines[-1]
+        ellipsis_width = text_width('...', family, size)
+        while last and text_width(last, family, size) + ellipsis_width > max_width:
+            last = last[:-1]
+        lines[-1] = last.rstrip() + '...'
+    return lines
+
+@dataclass(frozen=True)
+class CardFormat:
+    """Formato de saída do card: tamanho, fontes e limite de linhas de cada bloco"""
+    name: str
+    width: int
+    height: int
+    title_size: int
+    desc_size: int
+    title_lines: int
+    desc_lines: int
+    valign: str = 'middle'  # 'top' mantém o título na altura fixa do template original
+
+# Formatos disponíveis; feed, square e story compartilham o mesmo layout de texto
+SOCIAL_FORMATS = {
+    'feed': CardFormat('feed', 1080, 1350, 48, 28, 4, 5, valign='top'),
+    'square': CardFormat('square', 1080, 1080, 48, 28, 4, 5),
+    'story': CardFormat('story', 1080, 1920, 48, 28, 4, 5),
+    'og': CardFormat('og', 1200, 630, 40, 24, 2, 2)
+}
+
+# Temas: fundo, moldura (logo + rodapé), cores e margem lateral do texto
+CARD_THEMES = {
+    'branded': {'background': 'gradient', 'chrome': True, 'margin': 60,
+                'title_fill': '#2c3e50', 'desc_fill': '#5a6c7d'},
+    'simple': {'background': '#1e3a8a', 'chrome': False, 'margin': 120,
+               'title_fill': 'white', 'desc_fill': None}
+}
+
+SOCIAL_RENDER_WORKERS = int(os.getenv('SOCIAL_RENDER_WORKERS', '4'))
+
+@lru_cache(maxsize=16)
+def card_base_layer(theme: str, width: int, height: int, template_id: str = ''):
+    """Camada base do card (fundo + área do logo + rodapé), montada uma vez e copiada por post"""
+    from PIL import Image, ImageDraw
+    style = CARD_THEMES[theme]
+    if style['background'] == 'gradient':
+        # Gradiente vertical: mesma rampa do desenho linha a linha (R e G caem 1/4 da intensidade, B fixo)
+        ramp = Image.linear_gradient('L').resize((1, height), Image.BILINEAR).resize((width, height), Image.NEAREST)
+        img = Image.merge('RGB', (
+            ramp.point(lambda value: 240 - value // 4),
+            ramp.point(lambda value: 245 - value // 4),
+            Image.new('L', (width, height), 255)
+        ))
+    else:
+        img = Image.new('RGB', (width, height), color=style['background'])
+
+    if style['chrome']:
+        draw = ImageDraw.Draw(img)
+
+        # Área para logo (topo)
+        center_x = width // 2
+        draw.rectangle((40, 40, width - 40, 200), fill='#f8f9fa', outline='#e9ecef', width=2)
+        draw.text((center_x, 120), "SEU LOGO AQUI", fill='#6c757d', font=load_font('sans', 36), anchor='mm')
+
+        # Rodapé com informações
+        footer_y = height - 100
+        draw.rectangle((40, footer_y - 10, width - 40, footer_y + 50), fill='#2c3e50')
+        draw.text((center_x, footer_y + 20), f"Template ID: {template_id} | Gerado automaticamente",
+                  fill='white', font=load_font('sans', 20), anchor='mm')
+    return img
+
+@dataclass
+class TextBlock:
+    """Linhas já quebradas de um bloco de texto e sua altura em pixels"""
+    lines: List[str]
+    size: int
+    line_height: int
+    family: str = 'sans'
+
+    @property
+    def height(self) -> int:
+        return len(self.lines) * self.line_height
+
+@dataclass
+class CardLayout:
+    """Layout de texto de um post, reutilizado por todos os formatos com o mesmo estilo"""
+    title: TextBlock
+    description: Optional[TextBlock]
+    gap: int
+
+    @property
+    def height(self) -> int:
+        if not self.description or not self.description.lines:
+            return self.title.height
+        return self.title.height + self.gap + self.description.height
+
+class SocialCardRenderer:
+    """Renderiza um post em vários formatos (feed, square, story, og) numa única passada.
+    O texto é quebrado por largura em pixels uma vez por estilo e reaproveitado entre formatos."""
+
+    def __init__(self, output_dir: str = 'static', max_workers: int = SOCIAL_RENDER_WORKERS):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.counters = {'posts': 0, 'images': 0, 'layouts': 0, 'render_ms': 0.0}
+
+    def _count(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                self.counters[key] += value
+
+    def layout(self, content: Dict[str, str], card_format: CardFormat, theme: str = 'branded') -> CardLayout:
+        """Quebra título e descrição pela largura útil do formato"""
+        style = CARD_THEMES[theme]
+        max_width = card_format.width - 2 * style['margin']
+        title = TextBlock(
+            wrap_text_pixels(content.get('title', ''), 'sans', card_format.title_size, max_width, card_format.title_lines),
+            card_format.title_size, round(card_format.title_size * 1.25)
+        )
+        description = None
+        if style['desc_fill'] and content.get('meta_description'):
+            description = TextBlock(
+                wrap_text_pixels(content['meta_description'], 'sans', card_format.desc_size, max_width, card_format.desc_lines),
+                card_format.desc_size, round(card_format.desc_size * 1.25)
+            )
+        return CardLayout(title, description, gap=round(card_format.title_size * 1.25))
+
+    def text_top(self, card_format: CardFormat, layout: CardLayout, theme: str) -> int:
+        """Posição vertical do bloco de texto dentro da área livre do formato"""
+        if CARD_THEMES[theme]['chrome']:
+            area_top, area_bottom = 240, card_format.height - 130  # Entre a área do logo e o rodapé
+        else:
+            area_top, area_bottom = 0, card_format.height
+        if card_format.valign == 'top':
+            return area_top + 40
+        return area_top + max(0, (area_bottom - area_top - layout.height) // 2)
+
+    def text_lines(self, card_format: CardFormat, layout: CardLayout, theme: str) -> List[Tuple]:
+        """Linhas na ordem de leitura como (texto, família, tamanho, cor, y, altura da linha)"""
+        style = CARD_THEMES[theme]
+        y = self.text_top(card_format, layout, theme)
+
+        blocks = [(layout.title, style['title_fill'])]
+        if layout.description and layout.description.lines:
+            blocks.append((layout.description, style['desc_fill']))
+
+        lines = []
+        for index, (block, fill) in enumerate(blocks):
+            if index:
+                y += layout.gap
+            for line in block.lines:
+                lines.append((line, block.family, block.size, fill, y, block.line_height))
+                y += block.line_height
+        return lines
+
+    def draw_text(self, img, card_format: CardFormat, layout: CardLayout, theme: str,
+                  start: int = 0, end: Optional[int] = None):
+        """Desenha as linhas [start:end] do layout sobre a imagem"""
+        from PIL import ImageDraw
+        draw = ImageDraw.Draw(img)
+        center_x = card_format.width // 2
+        for text, family, size, fill, y, _ in self.text_lines(card_format, layout, theme)[start:end]:
+            draw.text((center_x, y), text, fill=fill, font=load_font(family, size), anchor='ma')
+
+    def fade_line(self, img, card_format: CardFormat, line: Tuple, alpha: float):
+        """Desenha uma linha com opacidade parcial, mesclando só a faixa que ela ocupa"""
+        from PIL import Image, ImageDraw
+        text, family, size, fill, y, line_height = line
+        box = (0, y, card_format.width, min(card_format.height, y + line_height))
+        strip = img.crop(box)
+        inked = strip.copy()
+        ImageDraw.Draw(inked).text((card_format.width // 2, 0), text, fill=fill,
+                                   font=load_font(family, size), anchor='ma')
+        img.paste(Image.blend(strip, inked, alpha), box[:2])
+
+    def render(self, content: Dict[str, str], formats: Optional[List[str]] = None,
+               template_id: str = '', theme: str = 'branded') -> Dict[str, object]:
+        """Gera as imagens (PIL) de todos os formatos pedidos para um post"""
+        started = time.monotonic()
+        layouts: Dict[Tuple, CardLayout] = {}
+        images = {}
+
+        for name in formats or list(SOCIAL_FORMATS):
+            card_format = SOCIAL_FORMATS[name]
+            # Formatos com mesma largura e fontes reaproveitam o layout do post
+            key = (card_format.width, card_format.title_size, card_format.desc_size,
+                   card_format.title_lines, card_format.desc_lines)
+            if key not in layouts:
+                layouts[key] = self.layout(content, card_format, theme)
+            img = card_base_layer(theme, card_format.width, card_format.height, template_id).copy()
+            self.draw_text(img, card_format, layouts[key], theme)
+            images[name] = img
+
+        self._count(posts=1, images=len(images), layouts=len(layouts),
+                    render_ms=(time.monotonic() - started) * 1000)
+        return images
+
+    def render_post(self, content: Dict[str, str], formats: Optional[List[str]] = None,
+                    template_id: str = '', theme: str = 'branded', prefix: str = 'social') -> Dict[str, str]:
+        """Renderiza e salva os formatos de um post; retorna {formato: caminho}"""
+        images = self.render(content, formats, template_id, theme)
+        os.makedirs(self.output_dir, exist_ok=True)
+        digest = hashlib.sha1(content.get('title', '').encode('utf-8')).hexdigest()[:8]
+        stamp = int(time.time())
+
+        paths = {}
+        for name, img in images.items():
+            path = f"{self.output_dir}/{prefix}_{name}_{stamp}_{digest}.png"
+            img.save(path)
+            paths[name] = path
+        return paths
+
+    def render_batch(self, contents: List[Dict[str, str]], formats: Optional[List[str]] = None,
+                     template_id: str = '', theme: str = 'branded') -> List[Dict[str, str]]:
+        """Renderiza vários posts em paralelo (o Pillow libera o GIL ao desenhar e codificar PNG)"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda content: self.render_post(content, formats, template_id, theme), contents))
+
+    def stats(self) -> Dict:
+        with self.lock:
+            counters = dict(self.counters)
+        glyphs = glyph_advance.cache_info()
+        return {
+            'posts': counters['posts'],
+            'images': counters['images'],
+            'layouts': counters['layouts'],
+            'avg_render_ms': round(counters['render_ms'] / counters['posts'], 1) if counters['posts'] else 0,
+            'glyph_cache': {'hits': glyphs.hits, 'misses': glyphs.misses, 'size': glyphs.currsize},
+            'fonts_loaded': load_font.cache_info().currsize
+        }
+
+social_renderer = SocialCardRenderer()
+
+# Vídeo local (Reels/Stories): formato do card, quadros por segundo, duração da revelação e do final parado
+VIDEO_FORMAT = os.getenv('VIDEO_FORMAT', 'story')
+VIDEO_FPS = int(os.getenv('VIDEO_FPS', '12'))
+VIDEO_REVEAL_SECONDS = float(os.getenv('VIDEO_REVEAL_SECONDS', '2'))
+VIDEO_HOLD_SECONDS = float(os.getenv('VIDEO_HOLD_SECONDS', '3'))
+VIDEO_CONTAINER = os.getenv('VIDEO_CONTAINER', 'auto')  # auto (mp4 com ffmpeg, senão webp), mp4, webp ou gif
+# Cada quadro cru de 1080x1920 ocupa ~6 MB: poucos workers e trechos curtos mantêm a memória baixa
+VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', '1'))
+VIDEO_CHUNK_FRAMES = int(os.getenv('VIDEO_CHUNK_FRAMES', '4'))
+# forkserver/spawn: os workers não herdam as threads do servidor Flask (fork com threads é inseguro)
+VIDEO_MP_START = os.getenv('VIDEO_MP_START',
+                           'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+def iter_video_frames(content: Dict[str, str], format_name: str, template_id: str,
+                      theme: str, reveals: List[float]):
+    """Gera, um a um, os quadros (RGB cru) de um trecho contínuo da animação.
+    A camada base vem do cache do processo e as linhas já completas são desenhadas uma única vez
+    no canvas acumulado: cada quadro só acrescenta a linha que está aparecendo."""
+    card_format = SOCIAL_FORMATS[format_name]
+    layout = social_renderer.layout(content, card_format, theme)
+    lines = social_renderer.text_lines(card_format, layout, theme)
+    canvas = card_base_layer(theme, card_format.width, card_format.height, template_id).copy()
+
+    drawn = 0
+    for reveal in reveals:
+        visible = len(lines) * reveal
+        complete = min(len(lines), int(visible))
+        if complete > drawn:
+            social_renderer.draw_text(canvas, card_format, layout, theme, drawn, complete)
+            drawn = complete
+        alpha = visible - complete
+        if complete < len(lines) and alpha > 0:
+            frame = canvas.copy()
+            social_renderer.fade_line(frame, card_format, lines[complete], alpha)
+        else:
+            frame = canvas
+        yield frame.tobytes()
+
+@lru_cache(maxsize=1)
+def webp_stream_encoder_available() -> bool:
+    """O codificador incremental de WebP animado do Pillow (API interna, usada pelo próprio
+    Image.save) funciona nesta versão? Testado uma vez com um quadro de 1x1."""
+    try:
+        from PIL import Image, _webp
+        encoder = _webp.WebPAnimEncoder((1, 1), 0, 0, False, 3, 5, False, False)
+        encoder.add(Image.new('RGB', (1, 1)).getim(), 0, False, 80, 100, 0)
+        encoder.add(None, 1, False, 80, 100, 0)
+        return encoder.assemble('', '', '') is not None
+    except Exception:
+        return False
+
+def render_video_frames(content: Dict[str, str], format_name: str, template_id: str,
+                        theme: str, reveals: List[float]) -> List[bytes]:
+    """Tarefa do pool de processos: um trecho curto de quadros"""
+    return list(iter_video_frames(content, format_name, template_id, theme, reveals))
+
+class VideoRenderer:
+    """Vídeo local do card com revelação animada do título e da descrição (só CPU).
+    Os quadros saem em ordem, um por vez, direto para o codificador: MP4 (ffmpeg) e WebP só
+    guardam o que já foi comprimido; o GIF guarda as imagens com paleta. Estados repetidos e o
+    final parado viram um único quadro com duração maior."""
+
+    def __init__(self, renderer: SocialCardRenderer, max_workers: int = VIDEO_WORKERS):
+        self.renderer = renderer
+        self.max_workers = max_workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.last: Dict = {}
+        self.counters = {'videos': 0, 'frames': 0, 'render_seconds': 0.0, 'encode_seconds': 0.0, 'errors': 0}
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        """Pool criado sob demanda; com um único worker os quadros são gerados no próprio processo"""
+        if self.max_workers <= 1:
+            return None
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context(VIDEO_MP_START))
+            return self.pool
+
+    def container(self) -> str:
+        if VIDEO_CONTAINER != 'auto':
+            return VIDEO_CONTAINER
+        return 'mp4' if shutil.which('ffmpeg') else 'webp'
+
+    def timeline(self, fps: int, line_count: int) -> Tuple[List[float], List[int]]:
+        """Progresso da revelação (0..1, ease-out) de cada quadro distinto e sua duração em ms;
+        quadros seguidos com o mesmo estado visível são fundidos"""
+        count = max(2, round(VIDEO_REVEAL_SECONDS * fps))
+        reveals: List[float] = []
+        durations: List[float] = []
+        last_state = None
+        for index in range(count):
+            reveal = 1 - (1 - index / (count - 1)) ** 3
+            visible = line_count * reveal
+            state = (int(visible), round((visible - int(visible)) * 32))  # Linhas completas e opacidade
+            if state == last_state:
+                durations[-1] += 1000 / fps
+                continue
+            last_state = state
+            reveals.append(reveal)
+            durations.append(1000 / fps)
+        durations[-1] += VIDEO_HOLD_SECONDS * 1000  # Último quadro fica parado
+        return reveals, [round(duration) for duration in durations]
+
+    def frames(self, content: Dict[str, str], format_name: str, template_id: str,
+               theme: str, reveals: List[float]):
+        """Quadros em ordem; no pool, poucos trechos em andamento por vez e cada buffer é
+        entregue e descartado antes do próximo"""
+        pool = self._pool()
+        if pool is None:
+            yield from iter_video_frames(content, format_name, template_id, theme, reveals)
+            return
+
+        chunks = deque(reveals[index:index + VIDEO_CHUNK_FRAMES]
+                       for index in range(0, len(reveals), VIDEO_CHUNK_FRAMES))
+        in_flight = deque()
+        delivered = 0
+        try:
+            while chunks or in_flight:
+                while chunks and len(in_flight) <= self.max_workers:
+                    in_flight.append(pool.submit(render_video_frames, content, format_name,
+                                                 template_id, theme, chunks.popleft()))
+                chunk_frames = in_flight.popleft().result()
+                while chunk_frames:
+                    yield chunk_frames.pop(0)
+                    delivered += 1
+        except Exception as e:
+            # Pool quebrado (worker morto): recria depois e termina os quadros aqui mesmo
+            print(f"⚠️ Pool de vídeo indisponível ({e}), gerando quadros no processo principal")
+            with self.lock:
+                self.pool = None
+            yield from iter_video_frames(content, format_name, template_id, theme, reveals[delivered:])
+
+    def encode(self, frames, durations: List[int], card_format: CardFormat,
+               container: str, path: str, fps: int):
+        from PIL import Image
+        size = (card_format.width, card_format.height)
+
+        if container == 'mp4':
+            # Quadros crus via stdin, um por vez; o mesmo buffer é reenviado enquanto o quadro dura
+            command = [
+                shutil.which('ffmpeg') or 'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{size[0]}x{size[1]}", '-r', str(fps), '-i', '-',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-movflags', '+faststart', path
+            ]
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                for frame, duration in zip(frames, durations):
+                    for _ in range(max(1, round(duration * fps / 1000))):
+                        process.stdin.write(frame)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg falhou: {process.stderr.read().decode('utf-8', 'ignore')[:200]}")
+            return
+
+        if container == 'webp' and webp_stream_encoder_available():
+            # Codificador incremental: cada quadro é comprimido ao chegar e o buffer cru é descartado
+            from PIL import _webp
+            encoder = _webp.WebPAnimEncoder(size, 0, 0, False, 3, 5, False, False)
+            timestamp = 0
+            for frame, duration in zip(frames, durations):
+                encoder.add(Image.frombytes('RGB', size, frame).getim(), timestamp, False, 80, 100, 4)
+                timestamp += duration
+            encoder.add(None, timestamp, False, 80, 100, 0)
+            data = encoder.assemble('', '', '')
+            if data is None:
+                raise RuntimeError("codificador WebP não gerou o arquivo")
+            with open(path, 'wb') as f:
+                f.write(data)
+            return
+
+        # Image.save precisa de todos os quadros para GIF (e WebP sem o codificador incremental):
+        # cada buffer cru é convertido e descartado na hora (GIF guarda só a paleta, 1 byte por pixel)
+        if container == 'gif':
+            images = [Image.frombytes('RGB', size, frame).quantize(colors=256) for frame in frames]
+            images[0].save(path, save_all=True, append_images=images[1:], duration=durations, loop=0)
+        else:
+            images = [Image.frombytes('RGB', size, frame) for frame in frames]
+            images[0].save(path, save_all=True, append_images=images[1:], duration=durations,
+                           loop=0, quality=80, method=4)
+
+    def render(self, content: Dict[str, str], template_id: str = '', theme: str = 'branded',
+               format_name: str = VIDEO_FORMAT, fps: int = VIDEO_FPS) -> Dict:
+        """Gera o vídeo do post; retorna path, container, quadros, fps de geração e tempos"""
+        card_format = SOCIAL_FORMATS[format_name]
+        container = self.container()
+        layout = self.renderer.layout(content, card_format, theme)
+        reveals, durations = self.timeline(fps, len(self.renderer.text_lines(card_format, layout, theme)))
+
+        os.makedirs(self.renderer.output_dir, exist_ok=True)
+        digest = hashlib.sha1(content.get('title', '').encode('utf-8')).hexdigest()[:8]
+        path = f"{self.renderer.output_dir}/video_{format_name}_{int(time.time())}_{digest}.{container}"
+
+        # Geração e codificação se intercalam: o tempo gerando quadros é medido à parte
+        render_seconds = 0.0
+
+        def timed(frames):
+            nonlocal render_seconds
+            while True:
+                started = time.monotonic()
+                frame = next(frames, None)
+                render_seconds += time.monotonic() - started
+                if frame is None:
+                    return
+                yield frame
+
+        try:
+            started = time.monotonic()
+            self.encode(timed(self.frames(content, format_name, template_id, theme, reveals)),
+                        durations, card_format, container, path, fps)
+            encode_seconds = time.monotonic() - started - render_seconds
+        except Exception:
+            with self.lock:
+                self.counters['errors'] += 1
+            raise
+
+        result = {
+            'path': path,
+            'container': container,
+            'frames': len(reveals),
+            'duration_seconds': round(sum(durations) / 1000, 2),
+            'render_fps': round(len(reveals) / render_seconds, 1) if render_seconds else 0,
+            'render_seconds': round(render_seconds, 3),
+            'encode_seconds': round(encode_seconds, 3),
+            'bytes': os.path.getsize(path)
+        }
+        with self.lock:
+            self.counters['videos'] += 1
+            self.counters['frames'] += len(reveals)
+            self.counters['render_seconds'] += render_seconds
+            self.counters['encode_seconds'] += encode_seconds
+            self.last = result
+
+        print(f"🎬 Vídeo local criado: {path} ({len(reveals)} quadros, {result['render_fps']} fps na geração, "
+              f"codificação {encode_seconds:.2f}s)")
+        return result
+
+    def stats(self) -> Dict:
+        with self.lock:
+            counters = dict(self.counters)
+            last = dict(self.last)
+        return {
+            'videos': counters['videos'],
+            'errors': counters['errors'],
+            'workers': self.max_workers,
+            'container': self.container(),
+            'render_fps': round(counters['frames'] / counters['render_seconds'], 1) if counters['render_seconds'] else 0,
+            'avg_encode_seconds': round(counters['encode_seconds'] / counters['videos'], 3) if counters['videos'] else 0,
+            'last': last
+        }
+
+video_renderer = VideoRenderer(social_renderer)
+
+# Endereço público deste servidor (ex.: https://app.exemplo.com.br): o Instagram baixa a mídia
+# renderizada de /static por ele. Sem ele, o post usa a imagem original da notícia.
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+INSTAGRAM_VIDEO_TIMEOUT = float(os.getenv('INSTAGRAM_VIDEO_TIMEOUT', '120'))
+
+def public_media_url(path: str) -> str:
+    """URL pública de uma mídia gerada localmente ('' se não houver como expô-la)"""
+    if path.startswith(('http://', 'https://')):
+        return path
+    if not path or not PUBLIC_BASE_URL or not os.path.exists(path):
+        return ''
+    return f"{PUBLIC_BASE_URL}/{path.lstrip('/')}"
+
 class SocialMediaPublisher:
     def __init__(self):
         self.instagram_token = os.getenv('INSTAGRAM_TOKEN', 'YOUR_INSTAGRAM_TOKEN')
@@ -1187,81 +4079,38 @@ class SocialMediaPublisher:
                 print(f"🎨 Criando vídeo no Canva usando template personalizado...")
                 print(f"📋 Template: {canva_template_url}")
 
-                # Quando a API estiver ativa, será usado o template real
-                return f"https://canva-generated-video-{int(time.time())}.mp4"
+                # A exportação pela API ainda não está integrada: o vídeo é gerado localmente abaixo
 
             except Exception as e:
                 print(f"Erro na API do Canva: {e}")
 
-        # Método 2: Simulação usando template personalizado
+        # Método 2: Vídeo local usando template personalizado
         print(f"🎨 Usando template personalizado do Canva: {canva_template_id}")
         print(f"🎥 Template URL: {canva_template_url}")
         print(f"📝 Título: {content['title']}")
 
-        # Cria versão local baseada no template
-        return self.create_branded_template(content, canva_template_id)
+        # Cria vídeo local baseado no template (revelação animada); se falhar, imagem estática
+        try:
+            return video_renderer.render(content, template_id=canva_template_id)['path']
+        except Exception as e:
+            print(f"⚠️ Erro ao gerar vídeo local: {e}")
+            return self.create_branded_template(content, canva_template_id)
 
     def create_branded_template(self, content: Dict[str, str], template_id: str) -> str:
         """Cria template com a marca personalizada baseado no design do Canva"""
-        from PIL import Image, ImageDraw, ImageFont
-        import textwrap
-
         try:
-            # Cria imagem base com cores do seu template
-            img = Image.new('RGB', (1080, 1350), color='#ffffff')  # Formato vertical para Stories/Reels
-            draw = ImageDraw.Draw(img)
-
-            # Adiciona fundo gradiente (simulando seu template)
-            # Você pode personalizar essas cores baseado no seu design
-            for y in range(1350):
-                color_intensity = int(255 * (y / 1350))
-                color = (240 - color_intensity//4, 245 - color_intensity//4, 255)
-                draw.line([(0, y), (1080, y)], fill=color)
-
-            # Área para logo (topo)
-            logo_area = (40, 40, 1040, 200)
-            draw.rectangle(logo_area, fill='#f8f9fa', outline='#e9ecef', width=2)
-            draw.text((540, 120), "SEU LOGO AQUI", fill='#6c757d', 
-                     font=self.get_font(36), anchor='mm')
-
-            # Título principal
-            title = content['title'][:80] + '...' if len(content['title']) > 80 else content['title']
-            wrapped_title = textwrap.fill(title, width=35)
-
-            title_font = self.get_font(48)
-            title_bbox = draw.textbbox((0, 0), wrapped_title, font=title_font)
-            title_height = title_bbox[3] - title_bbox[1]
-
-            # Posiciona título no centro-superior
-            title_y = 280
-            draw.text((540, title_y), wrapped_title, fill='#2c3e50', 
-                     font=title_font, anchor='mt', align='center')
-
-            # Descrição/resumo
-            if content.get('meta_description'):
-                desc = content['meta_description'][:200] + '...' if len(content['meta_description']) > 200 else content['meta_description']
-                wrapped_desc = textwrap.fill(desc, width=45)
-
-                desc_font = self.get_font(28)
-                desc_y = title_y + title_height + 60
-                draw.text((540, desc_y), wrapped_desc, fill='#5a6c7d', 
-                         font=desc_font, anchor='mt', align='center')
-
-            # Rodapé com informações
-            footer_y = 1250
-            draw.rectangle((40, footer_y-10, 1040, footer_y+50), fill='#2c3e50')
-            draw.text((540, footer_y+20), f"Template ID: {template_id} | Gerado automaticamente", 
-                     fill='white', font=self.get_font(20), anchor='mm')
+            started = time.monotonic()
+            img = social_renderer.render(content, ['feed'], template_id)['feed']  # Formato vertical para Stories/Reels
+            render_ms = (time.monotonic() - started) * 1000
 
             # Cria diretório se não existir
-            import os
             os.makedirs('static', exist_ok=True)
 
             # Salva a imagem
             filename = f"static/branded_template_{int(time.time())}.png"
             img.save(filename)
 
-            print(f"✅ Template personalizado criado: {filename}")
+            print(f"✅ Template personalizado criado: {filename} (render {render_ms:.1f} ms)")
             print(f"🎨 Baseado no template Canva: {template_id}")
 
             return filename
@@ -1270,38 +4119,10 @@ class SocialMediaPublisher:
             print(f"Erro ao criar template personalizado: {e}")
             return self.create_simple_video_template(content)
 
-    def get_font(self, size: int):
-        """Obtém fonte com tamanho específico"""
-        try:
-            # Tenta fontes comuns do sistema
-            fonts = ["arial.ttf", "helvetica.ttf", "DejaVuSans.ttf"]
-            for font_name in fonts:
-                try:
-                    from PIL import ImageFont
-                    return ImageFont.truetype(font_name, size)
-                except:
-                    continue
-            # Fallback para fonte padrão
-            from PIL import ImageFont
-            return ImageFont.load_default()
-        except:
-            from PIL import ImageFont
-            return ImageFont.load_default()
-
     def create_simple_video_template(self, content: Dict[str, str]) -> str:
         """Cria um template simples de vídeo/imagem (fallback)"""
-        from PIL import Image, ImageDraw
-        import textwrap
-
         try:
-            img = Image.new('RGB', (1080, 1080), color='#1e3a8a')
-            draw = ImageDraw.Draw(img)
-
-            title = content['title'][:100] + '...' if len(content['title']) > 100 else content['title']
-            wrapped_title = textwrap.fill(title, width=30)
-
-            font = self.get_font(48)
-            draw.text((540, 540), wrapped_title, fill='white', font=font, anchor='mm', align='center')
+            img = social_renderer.render(content, ['square'], theme='simple')['square']
 
             import os
             os.makedirs('static', exist_ok=True)
@@ -1320,23 +4141,30 @@ class SocialMediaPublisher:
         try:
             # Se token Instagram está configurado
             if self.instagram_token != 'YOUR_INSTAGRAM_TOKEN' and len(self.instagram_token) > 20:
-                import requests
                 
                 # API do Instagram Graph
                 instagram_api_url = "https://graph.facebook.com/v19.0"
                 
                 # Caption com hashtags
-                caption = f"{content.get('clean_title', content['title'])}\n\n{content['meta_description']}\n\n#LitoralNorte #SaoSebastiao #Ilhabela #Caraguatatuba #Ubatuba #Noticias #SaoPaulo"
+                caption = INSTAGRAM_CAPTION_TEMPLATE.substitute(title=content.get('clean_title', content['title']),
+                                                                description=content['meta_description'])
                 
-                # Dados para publicação
+                # Dados para publicação: o vídeo renderizado vira Reels (o Instagram só aceita MP4/MOV);
+                # a imagem renderizada ou, sem URL pública, a imagem da notícia viram post de feed
                 post_data = {
-                    'image_url': content.get('image_url', video_url),
                     'caption': caption[:2200],  # Limite do Instagram
                     'access_token': self.instagram_token
                 }
+                media_url = public_media_url(video_url)
+                if media_url and video_url.lower().endswith(('.mp4', '.mov')):
+                    post_data.update(media_type='REELS', video_url=media_url)
+                elif media_url and video_url.lower().endswith(('.png', '.jpg', '.jpeg')):
+                    post_data['image_url'] = media_url
+                else:
+                    post_data['image_url'] = content.get('image_url') or media_url
                 
                 # Endpoint para Instagram Business Account (precisa configurar)
-                response = requests.post(
+                response = http_client.post(
                     f"{instagram_api_url}/me/media",
                     data=post_data,
                     timeout=30
@@ -1346,13 +4174,18 @@ class SocialMediaPublisher:
                     media_data = response.json()
                     media_id = media_data.get('id')
                     
+                    # Reels são processados de forma assíncrona antes de poderem ser publicados
+                    if post_data.get('media_type') == 'REELS' and not self._wait_instagram_container(instagram_api_url, media_id):
+                        print(f"❌ Vídeo não foi processado pelo Instagram a tempo: {media_id}")
+                        return False
+                    
                     # Publica o media
                     publish_data = {
                         'creation_id': media_id,
                         'access_token': self.instagram_token
                     }
                     
-                    publish_response = requests.post(
+                    publish_response = http_client.post(
                         f"{instagram_api_url}/me/media_publish",
                         data=publish_data,
                         timeout=30
@@ -1374,7 +4207,7 @@ class SocialMediaPublisher:
                 print("📱 MODO DEMONSTRAÇÃO - Instagram")
                 print(f"📝 Caption: {content.get('clean_title', content['title'])}")
                 print(f"📄 Descrição: {content['meta_description'][:100]}...")
-                print(f"📸 Imagem: {content.get('image_url', video_url)}")
+                print(f"🎬 Mídia: {video_url or content.get('image_url', '')}")
                 print(f"🏷️ Hashtags: #LitoralNorte #SaoSebastiao #Ilhabela #Caraguatatuba #Ubatuba")
                 
                 # Simula criação de arquivo de post
@@ -1387,7 +4220,7 @@ class SocialMediaPublisher:
                         f.write(f"INSTAGRAM POST\n")
                         f.write(f"Título: {content.get('clean_title', content['title'])}\n")
                         f.write(f"Descrição: {content['meta_description']}\n")
-                        f.write(f"Imagem: {content.get('image_url', video_url)}\n")
+                        f.write(f"Mídia: {video_url or content.get('image_url', '')}\n")
                         f.write(f"Hashtags: #LitoralNorte #SaoSebastiao #Ilhabela #Caraguatatuba #Ubatuba\n")
                     
                     print(f"📄 Post salvo em: {post_filename}")
@@ -1400,18 +4233,32 @@ class SocialMediaPublisher:
             print(f"❌ Erro ao publicar no Instagram: {e}")
             return False
 
+    def _wait_instagram_container(self, api_url: str, container_id: str) -> bool:
+        """Espera o contêiner de vídeo ficar FINISHED (até INSTAGRAM_VIDEO_TIMEOUT)"""
+        deadline = time.monotonic() + INSTAGRAM_VIDEO_TIMEOUT
+        while time.monotonic() < deadline:
+            response = http_client.get(f"{api_url}/{container_id}",
+                                       params={'fields': 'status_code', 'access_token': self.instagram_token}, timeout=15)
+            status = response.json().get('status_code') if response.status_code == 200 else None
+            if status == 'FINISHED':
+                return True
+            if status in ('ERROR', 'EXPIRED'):
+                return False
+            time.sleep(3)
+        return False
+
     def publish_to_facebook(self, content: Dict[str, str], video_url: str) -> bool:
         """Publica no Facebook"""
         try:
             # Se token Facebook está configurado
             if self.facebook_token != 'YOUR_FACEBOOK_TOKEN' and len(self.facebook_token) > 20:
-                import requests
                 
                 # API do Facebook Graph
                 facebook_api_url = "https://graph.facebook.com/v19.0"
                 
                 # Mensagem do post
-                message = f"{content.get('clean_title', content['title'])}\n\n{content['meta_description']}\n\n#LitoralNorte #Noticias"
+                message = FACEBOOK_MESSAGE_TEMPLATE.substitute(title=content.get('clean_title', content['title']),
+                                                               description=content['meta_description'])
                 
                 # Dados para publicação com imagem
                 post_data = {
@@ -1422,7 +4269,7 @@ class SocialMediaPublisher:
                 
                 # Endpoint para página do Facebook (precisa configurar page_id)
                 page_id = "me"  # Substitua pelo ID da sua página
-                response = requests.post(
+                response = http_client.post(
                     f"{facebook_api_url}/{page_id}/feed",
                     data=post_data,
                     timeout=30
@@ -1468,11 +4315,376 @@ class SocialMediaPublisher:
             print(f"❌ Erro ao publicar no Facebook: {e}")
             return False
 
+# Fila de publicação: workers, novas tentativas com backoff exponencial e limite de tentativas
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', '3'))
+PUBLISH_MAX_ATTEMPTS = int(os.getenv('PUBLISH_MAX_ATTEMPTS', '4'))
+PUBLISH_RETRY_BASE = float(os.getenv('PUBLISH_RETRY_BASE', '10'))
+PUBLISH_RETRY_MAX = float(os.getenv('PUBLISH_RETRY_MAX', '600'))
+# Concessão (lease) de um job em execução: renovada enquanto o processo dono está vivo;
+# só depois de expirada o job volta para a fila (processo morto ou travado)
+PUBLISH_LEASE_SECONDS = float(os.getenv('PUBLISH_LEASE_SECONDS', '300'))
+# Etapas de publicação e a etapa de que cada uma depende (as redes sociais usam a mídia renderizada)
+PUBLISH_STEPS = {'wordpress': None, 'render': None, 'instagram': 'render', 'facebook': 'render'}
+
+class PublishQueue:
+    """Fila durável (SQLite) de publicação. Cada plataforma é um job separado, com novas tentativas e
+    chave de idempotência (artigo, plataforma): reenviar o mesmo artigo nunca repete um job concluído."""
+
+    def __init__(self, path: str = os.path.join(DATA_DIR, 'publish_queue.db'), workers: int = PUBLISH_WORKERS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        # Vários processos podem abrir a mesma fila: espera o lock de escrita do SQLite em vez de falhar
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS publish_runs (
+                run_id TEXT PRIMARY KEY,
+                title TEXT,
+                source_url TEXT,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS publish_jobs (
+                idempotency_key TEXT PRIMARY KEY,
+                run_id TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                depends_on TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_run_at REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                elapsed REAL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_until REAL
+            )
+        """)
+        # Bancos criados antes das concessões não têm as colunas owner/lease_until
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(publish_jobs)")]
+        if 'owner' not in columns:
+            self.conn.execute("ALTER TABLE publish_jobs ADD COLUMN owner TEXT")
+            self.conn.execute("ALTER TABLE publish_jobs ADD COLUMN lease_until REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_publish_jobs_pending ON publish_jobs (status, next_run_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_publish_jobs_run ON publish_jobs (run_id, platform)")
+        # Dependentes que ficaram pendentes atrás de uma etapa que já falhou de vez (filas antigas)
+        self.conn.execute("""
+            UPDATE publish_jobs SET status = 'failed', error = 'etapa ''' || depends_on || ''' falhou', updated_at = ?
+            WHERE status = 'pending' AND depends_on IS NOT NULL AND EXISTS (
+                SELECT 1 FROM publish_jobs d
+                WHERE d.run_id = publish_jobs.run_id AND d.platform = publish_jobs.depends_on AND d.status = 'failed'
+            )
+        """, (time.time(),))
+        self.conn.commit()
+        # Jobs em execução não são tocados aqui: outro processo pode estar executando-os.
+        # Os interrompidos voltam para a fila em _claim, quando a concessão expira.
+        self.owner = f"{os.getpid()}-{os.urandom(4).hex()}"
+        self.workers = workers
+        self.wakeup = threading.Event()
+        self.start_lock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+
+    @staticmethod
+    def run_id_for(content: Dict) -> str:
+        """ID estável do artigo: a mesma notícia sempre gera o mesmo job"""
+        basis = normalize_url(content['source_url']) if content.get('source_url') else content.get('clean_title', content['title'])
+        return hashlib.sha256(basis.encode('utf-8')).hexdigest()[:16]
+
+    def _save_run(self, run_id: str, content: Dict, now: float):
+        """Grava (ou atualiza) o conteúdo do artigo, mantendo a data de criação (chamado com o lock)"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO publish_runs (run_id, title, source_url, content, created_at) "
+            "VALUES (?, ?, ?, ?, COALESCE((SELECT created_at FROM publish_runs WHERE run_id = ?), ?))",
+            (run_id, content.get('clean_title', content.get('title', '')), content.get('source_url'),
+             json.dumps(content, ensure_ascii=False), run_id, now)
+        )
+
+    def enqueue(self, content: Dict) -> str:
+        """Enfileira a publicação em todas as plataformas e retorna o ID do job"""
+        run_id = self.run_id_for(content)
+        now = time.time()
+        with self.lock:
+            self._save_run(run_id, content, now)
+            for platform, depends_on in PUBLISH_STEPS.items():
+                key = f"{run_id}:{platform}"
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO publish_jobs (idempotency_key, run_id, platform, depends_on, status, next_run_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                    (key, run_id, platform, depends_on, now, now)
+                )
+                # Reenvio manual reabre só o que falhou de vez; jobs concluídos nunca se repetem
+                self.conn.execute(
+                    "UPDATE publish_jobs SET status = 'pending', attempts = 0, next_run_at = ?, error = NULL, updated_at = ? "
+                    "WHERE idempotency_key = ? AND status = 'failed'",
+                    (now, now, key)
+                )
+            self.conn.commit()
+        self.wakeup.set()
+        return run_id
+
+    def claim_step(self, content: Dict, platform: str) -> Optional[str]:
+        """Reserva uma etapa executada fora dos workers (ex.: WordPress em /publish_batch) sob a mesma
+        chave de idempotência dos jobs. Retorna o run_id, ou None se a etapa já foi concluída ou
+        está em execução em outro lugar."""
+        run_id = self.run_id_for(content)
+        key = f"{run_id}:{platform}"
+        now = time.time()
+        with self.lock:
+            self._save_run(run_id, content, now)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO publish_jobs (idempotency_key, run_id, platform, depends_on, status, next_run_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                (key, run_id, platform, PUBLISH_STEPS[platform], now, now)
+            )
+            cursor = self.conn.execute(
+                "UPDATE publish_jobs SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE idempotency_key = ? AND status IN ('pending', 'failed')",
+                (self.owner, now + PUBLISH_LEASE_SECONDS, now, key)
+            )
+            self.conn.commit()
+        return run_id if cursor.rowcount == 1 else None
+
+    def finish_step(self, run_id: str, platform: str, result: Optional[Dict], error: Optional[str] = None):
+        """Grava o resultado de uma etapa reservada com claim_step"""
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE publish_jobs SET status = ?, result = ?, error = ?, next_run_at = ?, updated_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE idempotency_key = ? AND owner = ?",
+                ('failed' if error else 'done', json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, now, now, f"{run_id}:{platform}", self.owner)
+            )
+            if cursor.rowcount == 1 and error:
+                self._fail_dependents(run_id, platform, now)
+            self.conn.commit()
+
+    def start(self):
+        """Inicia os workers uma única vez por processo (chamadas repetidas não fazem nada)"""
+        with self.start_lock:
+            if self.threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"publish-worker-{number}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            thread = threading.Thread(target=self._renew_leases, name="publish-lease", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _renew_leases(self):
+        """Mantém válidas as concessões dos jobs que este processo está executando"""
+        while True:
+            time.sleep(PUBLISH_LEASE_SECONDS / 3)
+            try:
+                with self.lock:
+                    self.conn.execute(
+                        "UPDATE publish_jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                        (time.time() + PUBLISH_LEASE_SECONDS, self.owner)
+                    )
+                    self.conn.commit()
+            except Exception as e:
+                print(f"⚠️ Erro ao renovar concessões da fila de publicação: {e}")
+
+    def _worker(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"⚠️ Erro na fila de publicação: {e}")
+                job = None
+            if job is None:
+                self.wakeup.wait(timeout=1.0)
+                self.wakeup.clear()
+                continue
+            self._execute(*job)
+            # Jobs dependentes podem ter ficado prontos
+            self.wakeup.set()
+
+    def _fail_dependents(self, run_id: str, platform: str, now: float):
+        """Falha de vez de uma etapa: as que dependem dela falham junto (chamado com o lock,
+        na mesma transação que grava a falha)"""
+        self.conn.execute(
+            "UPDATE publish_jobs SET status = 'failed', error = ?, updated_at = ? "
+            "WHERE run_id = ? AND depends_on = ? AND status = 'pending'",
+            (f"etapa '{platform}' falhou", now, run_id, platform)
+        )
+
+    def _claim(self) -> Optional[Tuple[str, str, str, int]]:
+        """Pega o próximo job pronto (dependência concluída, filtrada no próprio SQL) e o marca como
+        em execução. O UPDATE condicional (status ainda 'pending') garante um único dono mesmo entre processos."""
+        now = time.time()
+        with self.lock:
+            # Concessão expirada: o processo dono parou no meio do job, que volta para a fila
+            self.conn.execute(
+                "UPDATE publish_jobs SET status = 'pending', owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (now, now)
+            )
+            rows = self.conn.execute("""
+                SELECT j.idempotency_key, j.run_id, j.platform, j.attempts
+                FROM publish_jobs j
+                LEFT JOIN publish_jobs d ON d.run_id = j.run_id AND d.platform = j.depends_on
+                WHERE j.status = 'pending' AND j.next_run_at <= ?
+                  AND (j.depends_on IS NULL OR d.status = 'done')
+                ORDER BY j.next_run_at
+                LIMIT 10
+            """, (now,)).fetchall()
+            
+            claimed = None
+            for key, run_id, platform, attempts in rows:
+                cursor = self.conn.execute(
+                    "UPDATE publish_jobs SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE idempotency_key = ? AND status = 'pending'",
+                    (self.owner, now + PUBLISH_LEASE_SECONDS, now, key)
+                )
+                if cursor.rowcount != 1:
+                    continue  # Outro worker/processo pegou antes
+                claimed = (key, run_id, platform, attempts + 1)
+                break
+            self.conn.commit()
+        return claimed
+
+    def _execute(self, key: str, run_id: str, platform: str, attempt: int):
+        with self.lock:
+            content = json.loads(self.conn.execute(
+                "SELECT content FROM publish_runs WHERE run_id = ?", (run_id,)).fetchone()[0])
+            render_row = self.conn.execute(
+                "SELECT result FROM publish_jobs WHERE run_id = ? AND platform = 'render'", (run_id,)).fetchone()
+        render_result = json.loads(render_row[0]) if render_row and render_row[0] else {}
+
+        started = time.monotonic()
+        try:
+            result = self._run_step(platform, content, render_result)
+            status, error, next_run_at = 'done', None, time.time()
+            print(f"✅ Job {run_id}/{platform} concluído")
+        except Exception as e:
+            result = None
+            error = str(e)
+            if attempt >= PUBLISH_MAX_ATTEMPTS:
+                status, next_run_at = 'failed', time.time()
+                print(f"❌ Job {run_id}/{platform} falhou após {attempt} tentativas: {error}")
+            else:
+                # Backoff exponencial com jitter
+                delay = min(PUBLISH_RETRY_MAX, PUBLISH_RETRY_BASE * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+                status, next_run_at = 'pending', time.time() + delay
+                print(f"⏳ Job {run_id}/{platform} falhou ({error}), nova tentativa em {delay:.0f}s")
+        elapsed = time.monotonic() - started
+
+        with self.lock:
+            # Só o dono atual grava o resultado (a concessão pode ter expirado e passado para outro)
+            cursor = self.conn.execute(
+                "UPDATE publish_jobs SET status = ?, result = ?, error = ?, next_run_at = ?, elapsed = ?, updated_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE idempotency_key = ? AND owner = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                 next_run_at, round(elapsed, 3), time.time(), key, self.owner)
+            )
+            if cursor.rowcount == 1 and status == 'failed':
+                self._fail_dependents(run_id, platform, time.time())
+            self.conn.commit()
+        if cursor.rowcount != 1:
+            print(f"⚠️ Job {run_id}/{platform} mudou de dono durante a execução; resultado descartado")
+
+    def _run_step(self, platform: str, content: Dict, render_result: Dict) -> Dict:
+        """Executa uma etapa; levanta exceção para que seja tentada de novo"""
+        if platform == 'wordpress':
+            if not wp_publisher.publish_post(content):
+                raise Exception("WordPress não confirmou a publicação")
+            if content.get('source_url'):
+                seen_store.mark(content['source_url'], 'published', content.get('clean_title', ''))
+            return {'published': True}
+        
+        if platform == 'render':
+            return {'video_url': social_publisher.create_video_with_canva(content)}
+        
+        video_url = render_result.get('video_url', '')
+        if platform == 'instagram':
+            if not social_publisher.publish_to_instagram(content, video_url):
+                raise Exception("Instagram não confirmou a publicação")
+            return {'published': True}
+        
+        if platform == 'facebook':
+            if not social_publisher.publish_to_facebook(content, video_url):
+                raise Exception("Facebook não confirmou a publicação")
+            return {'published': True}
+        
+        raise ValueError(f"Etapa desconhecida: {platform}")
+
+    def status(self, run_id: str) -> Optional[Dict]:
+        """Progresso do job: estado geral e detalhes por plataforma"""
+        with self.lock:
+            run = self.conn.execute("SELECT title, source_url, created_at FROM publish_runs WHERE run_id = ?",
+                                    (run_id,)).fetchone()
+            if run is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT platform, status, attempts, next_run_at, result, error, elapsed FROM publish_jobs WHERE run_id = ?",
+                (run_id,)
+            ).fetchall()
+
+        jobs = {}
+        for platform, status, attempts, next_run_at, result, error, elapsed in rows:
+            jobs[platform] = {
+                'status': status,
+                'attempts': attempts,
+                'error': error,
+                'elapsed': elapsed,
+                'result': json.loads(result) if result else None,
+                'retry_in': round(max(0.0, next_run_at - time.time()), 1) if status == 'pending' and attempts else None
+            }
+
+        statuses = [job['status'] for job in jobs.values()]
+        if all(status == 'done' for status in statuses):
+            state = 'done'
+        elif any(status in ('pending', 'running') for status in statuses):
+            state = 'running'
+        else:
+            state = 'failed' if jobs.get('wordpress', {}).get('status') == 'failed' else 'partial'
+
+        return {
+            'job_id': run_id,
+            'title': run[0],
+            'source_url': run[1],
+            'state': state,
+            'progress': f"{statuses.count('done')}/{len(statuses)}",
+            'jobs': jobs,
+            'results': {platform: job['status'] == 'done' for platform, job in jobs.items()},
+            'video_url': (jobs.get('render', {}).get('result') or {}).get('video_url')
+        }
+
+    def wait(self, run_id: str, timeout: float) -> Optional[Dict]:
+        """Espera o job terminar (ou o prazo acabar) e retorna seu status; com o prazo esgotado
+        o estado continua 'running' e o job segue na fila"""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.status(run_id)
+            if status is None or status['state'] != 'running' or time.monotonic() >= deadline:
+                return status
+            time.sleep(0.25)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM publish_jobs GROUP BY status").fetchall())
+
+# Tempo esperado por cada etapa quando a publicação é aguardada (wait=true e modo automático)
+PUBLISH_BRANCH_TIMEOUTS = {
+    'wordpress': float(os.getenv('PUBLISH_TIMEOUT_WORDPRESS', '90')),
+    'render': float(os.getenv('PUBLISH_TIMEOUT_RENDER', '60')),
+    'instagram': float(os.getenv('PUBLISH_TIMEOUT_INSTAGRAM', '45')),
+    'facebook': float(os.getenv('PUBLISH_TIMEOUT_FACEBOOK', '45'))
+}
+# WordPress e render correm juntos; as redes sociais esperam o render
+PUBLISH_WAIT_TIMEOUT = max(PUBLISH_BRANCH_TIMEOUTS['wordpress'],
+                           PUBLISH_BRANCH_TIMEOUTS['render'] + max(PUBLISH_BRANCH_TIMEOUTS['instagram'],
+                                                                   PUBLISH_BRANCH_TIMEOUTS['facebook']))
+
 # Instâncias globais
 news_collector = NewsCollector()
 seo_generator = SEOGenerator()
+gemini_scheduler = GeminiScheduler(seo_generator)
 wp_publisher = WordPressPublisher()
 social_publisher = SocialMediaPublisher()
+publish_queue = PublishQueue()
 
 # Configurações globais - Palavras-chave fixas do Litoral Norte Paulista
 KEYWORDS = [
@@ -1485,31 +4697,105 @@ KEYWORDS = [
 ]
 AUTO_MODE = False
 
+@app.before_request
+def ensure_background_workers():
+    """Inicia agendador e workers da fila no primeiro request do processo que atende as
+    requisições, seja com python main.py, flask run ou gunicorn"""
+    start_background_workers()
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def article_to_dict(article: Article, collected_at: str) -> Dict:
+    """Converte artigo para JSON (itens sem data usam o horário da coleta)"""
+    return {
+        'title': article.title,
+        'url': article.url,
+        'description': article.description,
+        'published_at': article.published_at or collected_at,
+        'source': article.source,
+        'related_urls': article.related_urls,
+        'keywords': article.keywords
+    }
+
 @app.route('/search_news', methods=['POST'])
 def search_news():
     """Busca notícias baseada em palavras-chave"""
     data = request.get_json()
     keywords = data.get('keywords', KEYWORDS)
     hours = data.get('hours', 24)
+    only_new = data.get('only_new', False)
+    incremental = data.get('incremental', False)
 
-    articles = news_collector.search_news(keywords, hours)
+    result = news_collector.collect(keywords, hours, only_new=only_new, incremental=incremental)
 
     # Converte para dicionário para JSON
-    articles_dict = []
-    for article in articles:
-        articles_dict.append({
-            'title': article.title,
-            'url': article.url,
-            'description': article.description,
-            'published_at': article.published_at,
-            'source': article.source
-        })
+    collected_at = datetime.now(timezone.utc).isoformat()
+    articles_dict = [article_to_dict(article, collected_at) for article in result.articles]
+
+    return jsonify({
+        'articles': articles_dict,
+        'stats': result.stats,
+        'elapsed': result.elapsed,
+        'timed_out': result.timed_out,
+        'first_result_ms': result.first_result_ms
+    })
+
+@app.route('/search_news_stream', methods=['POST'])
+def search_news_stream():
+    """Busca notícias emitindo NDJSON: um evento 'articles' por unidade concluída
+    (já sem duplicatas) e um evento 'summary' final com a lista consolidada"""
+    data = request.get_json()
+    keywords = data.get('keywords', KEYWORDS)
+    hours = data.get('hours', 24)
+    only_new = data.get('only_new', False)
+    incremental = data.get('incremental', False)
+
+    def generate():
+        collected_at = datetime.now(timezone.utc).isoformat()
+        seen_urls = set()
+        stories = NearDuplicateIndex()
+        
+        for event, payload in news_collector.iter_collect(keywords, hours, only_new=only_new, incremental=incremental):
+            if event == 'unit':
+                articles = payload['articles']
+                if only_new:
+                    # As estatísticas do filtro são contadas uma vez só, no resultado final
+                    articles = seen_store.filter_new(articles, count_stats=False)
+                
+                # Deduplicação incremental: por URL e pela mesma notícia já enviada
+                batch = []
+                for article in articles:
+                    if article.url in seen_urls:
+                        continue
+                    seen_urls.add(article.url)
+                    fingerprint = story_simhash(article.title, article.description)
+                    if stories.query(fingerprint):
+                        continue
+                    stories.add(fingerprint, article.url)
+                    batch.append(article_to_dict(article, collected_at))
+                
+                if batch:
+                    yield json.dumps({
+                        'event': 'articles',
+                        'source': payload['source'],
+                        'query': payload['query'],
+                        'elapsed_ms': payload['elapsed_ms'],
+                        'articles': batch
+                    }, ensure_ascii=False) + '\n'
+            else:
+                yield json.dumps({
+                    'event': 'summary',
+                    'articles': [article_to_dict(article, collected_at) for article in payload.articles],
+                    'stats': payload.stats,
+                    'elapsed': payload.elapsed,
+                    'timed_out': payload.timed_out,
+                    'first_result_ms': payload.first_result_ms
+                }, ensure_ascii=False) + '\n'
 
-    return jsonify({'articles': articles_dict})
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/generate_content', methods=['POST'])
 def generate_content():
@@ -1525,31 +4811,125 @@ def generate_content():
     )
 
     seo_content = seo_generator.generate_seo_content(article)
+    seen_store.mark_article(article, 'processed')
 
     return jsonify(seo_content)
 
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    """Gera conteúdo SEO para vários artigos de uma vez (Gemini em paralelo, dentro da cota)"""
+    data = request.get_json() or {}
+
+    articles = [Article(
+        title=item['title'],
+        url=item['url'],
+        description=item['description'],
+        published_at=item['published_at'],
+        source=item['source']
+    ) for item in data.get('articles', [])[:GEMINI_BATCH_MAX_ARTICLES]]
+
+    started = time.monotonic()
+    generations = gemini_scheduler.generate_many(articles)
+
+    contents = []
+    for article, generation in zip(articles, generations):
+        # Parágrafos vêm prontos do agendador (acertos e faltas do cache contados só lá);
+        # artigos que falharam usam direto o texto padrão
+        seo_content = seo_generator.generate_seo_content(article, use_gemini=False,
+                                                         paragraphs=generation['paragraphs'])
+        seo_content['gemini'] = {key: generation[key] for key in ('cached', 'packed', 'error')}
+        seen_store.mark_article(article, 'processed')
+        contents.append(seo_content)
+
+    return jsonify({
+        'contents': contents,
+        'elapsed': round(time.monotonic() - started, 2),
+        'gemini': gemini_scheduler.stats()
+    })
+
+@app.route('/render_social', methods=['POST'])
+def render_social():
+    """Renderiza os cards sociais de vários posts em todos os formatos pedidos"""
+    data = request.get_json() or {}
+    formats = [name for name in data.get('formats') or list(SOCIAL_FORMATS) if name in SOCIAL_FORMATS]
+
+    started = time.monotonic()
+    assets = social_renderer.render_batch(data.get('contents', []), formats,
+                                          template_id=data.get('template_id', ''))
+    return jsonify({
+        'assets': assets,
+        'formats': formats,
+        'elapsed': round(time.monotonic() - started, 2),
+        'renderer': social_renderer.stats()
+    })
+
 @app.route('/publish_content', methods=['POST'])
 def publish_content():
-    """Publica conteúdo em todas as plataformas"""
+    """Enfileira a publicação em todas as plataformas e retorna o ID do job imediatamente;
+    com "wait": true espera o job terminar (plataformas em paralelo nos workers) e retorna o resultado.
+    Os dois modos passam pela fila: repetir o pedido nunca publica duas vezes."""
     data = request.get_json()
     content = data.get('content')
 
-    results = {}
+    job_id = publish_queue.enqueue(content)
+
+    if data.get('wait'):
+        started = time.monotonic()
+        status = publish_queue.wait(job_id, PUBLISH_WAIT_TIMEOUT)
+        return jsonify(dict(
+            status,
+            success=True,
+            status_url=url_for('publish_status', job_id=job_id),
+            errors={platform: job['error'] for platform, job in status['jobs'].items() if job['error']},
+            latency={platform: job['elapsed'] for platform, job in status['jobs'].items()},
+            elapsed=round(time.monotonic() - started, 2)
+        ))
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('publish_status', job_id=job_id)
+    }), 202
+
+@app.route('/publish_status/<job_id>')
+def publish_status(job_id):
+    """Progresso de um job de publicação (por plataforma)"""
+    status = publish_queue.status(job_id)
+    if status is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+    return jsonify(dict(status, success=True))
 
-    # Publica no WordPress
-    results['wordpress'] = wp_publisher.publish_post(content)
+@app.route('/publish_batch', methods=['POST'])
+def publish_batch():
+    """Publica vários conteúdos já gerados no WordPress via endpoint batch; artigos cuja etapa
+    WordPress já foi concluída pela fila voltam com skipped=True"""
+    data = request.get_json() or {}
+    contents = data.get('contents', [])
 
-    # Cria vídeo no Canva
-    video_url = social_publisher.create_video_with_canva(content)
+    started = time.monotonic()
+    # Mesma chave de idempotência da fila: o que já foi (ou está sendo) publicado não é criado de novo
+    run_ids = [publish_queue.claim_step(content, 'wordpress') for content in contents]
+    claimed = [content for content, run_id in zip(contents, run_ids) if run_id]
+    published = iter(wp_publisher.publish_posts(claimed))
 
-    # Publica nas redes sociais
-    results['instagram'] = social_publisher.publish_to_instagram(content, video_url)
-    results['facebook'] = social_publisher.publish_to_facebook(content, video_url)
+    results = []
+    for content, run_id in zip(contents, run_ids):
+        if run_id is None:
+            results.append({'success': True, 'id': None, 'link': None, 'error': None, 'skipped': True})
+            continue
+        result = next(published)
+        if result['success']:
+            publish_queue.finish_step(run_id, 'wordpress', {'published': True, 'id': result['id'], 'link': result['link']})
+            if content.get('source_url'):
+                seen_store.mark(content['source_url'], 'published', content.get('clean_title', ''))
+        else:
+            publish_queue.finish_step(run_id, 'wordpress', None, result['error'] or 'WordPress não confirmou a publicação')
+        results.append(result)
 
     return jsonify({
-        'success': True,
+        'success': all(result['success'] for result in results),
         'results': results,
-        'video_url': video_url
+        'elapsed': round(time.monotonic() - started, 2)
     })
 
 @app.route('/toggle_auto_mode', methods=['POST'])
@@ -1569,21 +4949,51 @@ def toggle_auto_mode():
 
     return jsonify({'auto_mode': AUTO_MODE})
 
+@app.route('/http_stats')
+def http_stats():
+    """Retorna estatísticas do pool de conexões HTTP compartilhado"""
+    return jsonify({
+        'http2': http_client.h2_client is not None,
+        'hosts': http_client.pool_stats(),
+        'feed_cache': feed_cache.stats(),
+        'gemini_cache': gemini_cache.stats(),
+        'gemini': gemini_scheduler.stats(),
+        'wp_tags': wp_publisher.tag_index.stats(),
+        'wp_categories': wp_publisher.category_index.stats(),
+        'wp_media': wp_publisher.media_index.stats(),
+        'social_renderer': social_renderer.stats(),
+        'video': video_renderer.stats()
+    })
+
+@app.route('/parser_benchmark')
+def parser_benchmark():
+    """Mede o ganho do parsing atual em relação ao caminho antigo"""
+    iterations = min(int(request.args.get('iterations', 20)), 200)
+    return jsonify({
+        'parsers': PARSER_BY_SOURCE,
+        'results': benchmark_parsers(iterations)
+    })
+
+@app.route('/source_health')
+def source_health_status():
+    """Retorna o estado do circuit breaker e as latências de cada host de notícias"""
+    return jsonify({'hosts': source_health.snapshot()})
+
 @app.route('/auto_status')
 def auto_status():
     """Retorna status do modo automático"""
-    return jsonify({'auto_mode': AUTO_MODE})
+    return jsonify({'auto_mode': AUTO_MODE, 'seen_articles': seen_store.stats(), 'publish_queue': publish_queue.stats()})
 
 def run_auto_process():
     """Executa processo automático completo"""
     print("🔄 Iniciando processo automático...")
 
     try:
-        # 1. Busca notícias
-        articles = news_collector.search_news(KEYWORDS, 24)
+        # 1. Busca notícias ainda não processadas em execuções anteriores
+        articles = news_collector.collect(KEYWORDS, 24, only_new=True, incremental=True).articles
 
         if not articles:
-            print("❌ Nenhum artigo encontrado")
+            print("❌ Nenhum artigo novo encontrado")
             return
 
         # 2. Seleciona o primeiro artigo (pode implementar lógica de seleção)
@@ -1591,13 +5001,16 @@ def run_auto_process():
         print(f"📰 Artigo selecionado: {selected_article.title}")
 
         # 3. Gera conteúdo SEO
-        seo_content = seo_generator.generate_seo_content(selected_article)
+        # (sem o HTML de preview: ninguém olha a interface no modo automático)
+        seo_content = seo_generator.generate_seo_content(selected_article, render_preview=False)
+        seen_store.mark_article(selected_article, 'processed')
 
-        # 4. Publica em todas as plataformas
-        wp_publisher.publish_post(seo_content)
-        video_url = social_publisher.create_video_with_canva(seo_content)
-        social_publisher.publish_to_instagram(seo_content, video_url)
-        social_publisher.publish_to_facebook(seo_content, video_url)
+        # 4. Publica pela fila (mesma idempotência e novas tentativas da publicação manual)
+        job_id = publish_queue.enqueue(seo_content)
+        status = publish_queue.wait(job_id, PUBLISH_WAIT_TIMEOUT)
+        if status['results'].get('wordpress'):
+            seen_store.mark_article(selected_article, 'published')
+        print(f"📬 Job {job_id}: {status['state']} ({status['progress']})")
 
         print("✅ Processo automático concluído com sucesso!")
 
@@ -1610,9 +5023,30 @@ def run_scheduler():
         schedule.run_pending()
         time.sleep(60)
 
-# Inicia thread do agendador
-scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-scheduler_thread.start()
+BACKGROUND_LOCK = threading.Lock()
+BACKGROUND_STARTED = False
+
+def start_background_workers():
+    """Agendador e workers da fila de publicação; só no processo que atende as requisições
+    e uma única vez (o pool de vídeo já é criado sob demanda no primeiro render)"""
+    global BACKGROUND_STARTED
+    with BACKGROUND_LOCK:
+        if BACKGROUND_STARTED:
+            return
+        BACKGROUND_STARTED = True
+
+    # Inicia thread do agendador
+    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+    scheduler_thread.start()
+
+    # Inicia os workers da fila de publicação (retomam jobs pendentes de execuções anteriores)
+    publish_queue.start()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    debug = True
+    # Com o reloader do modo debug o módulo roda em dois processos: o monitor e o filho que
+    # atende as requisições (WERKZEUG_RUN_MAIN). Só o filho inicia os workers já na partida
+    # (retomando jobs pendentes); fora daqui eles sobem no primeiro request.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
+    app.run(host='0.0.0.0', port=5000, debug=debug)
\ No newline at end of file